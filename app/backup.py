@@ -0,0 +1,126 @@
+# app/backup.py
+"""
+Online snapshots of the SQLite database.
+
+Two methods are supported:
+  backup  SQLite's online backup API. In WAL mode (the app's default) the whole
+          database is copied in one step, i.e. in one read transaction: readers
+          do not block writers, and a multi-step backup would start over after
+          every commit made by another connection, so under steady ingest it
+          would never finish. With a rollback journal the copy runs in steps of
+          BACKUP_PAGES pages, releasing the lock in between; a step that finds
+          the database busy is retried after BACKUP_SLEEP_MS.
+  vacuum  VACUUM INTO, a single read transaction that writes a compacted copy.
+
+The snapshot is written to a temporary file and then streamed out gzip-compressed.
+
+Usage:
+    python -m app.backup /backups/app-$(date +%F).db.gz [--method vacuum]
+    python -m app.backup /backups/app-$(date +%F).shard1.db.gz --shard 1
+
+With SHARD_COUNT > 1 each shard is a separate file (app/sharding.py) and a
+snapshot holds one of them: back up every shard, one run each.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import zlib
+from typing import Iterator
+
+DEFAULT_PAGES = 256
+DEFAULT_SLEEP_MS = 10
+CHUNK_SIZE = 256 * 1024
+METHODS = ("backup", "vacuum")
+
+
+def snapshot(source: sqlite3.Connection, target_path: str, method: str = "backup") -> None:
+    """Write a consistent copy of `source` to `target_path`."""
+    if method == "vacuum":
+        source.execute("VACUUM INTO ?", (target_path,))
+        return
+    if method != "backup":
+        raise ValueError(f"unknown backup method {method!r}")
+
+    if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+        pages = -1  # one step: a consistent read snapshot, no restarts
+    else:
+        pages = int(os.getenv("BACKUP_PAGES", DEFAULT_PAGES))
+    sleep = int(os.getenv("BACKUP_SLEEP_MS", DEFAULT_SLEEP_MS)) / 1000
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+
+
+def snapshot_to_tempfile(source: sqlite3.Connection, method: str = "backup") -> str:
+    """Snapshot into a fresh temporary file (in BACKUP_TMPDIR) and return its path."""
+    fd, path = tempfile.mkstemp(prefix="snapshot-", suffix=".db", dir=os.getenv("BACKUP_TMPDIR"))
+    os.close(fd)
+    # VACUUM INTO refuses to overwrite an existing file
+    os.unlink(path)
+    try:
+        snapshot(source, path, method)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return path
+
+
+def iter_gzip(path: str, level: int = 6, remove: bool = True) -> Iterator[bytes]:
+    """Stream a file as gzip in CHUNK_SIZE pieces, optionally deleting it afterwards."""
+    try:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                out = compressor.compress(chunk)
+                if out:
+                    yield out
+        yield compressor.flush()
+    finally:
+        if remove and os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None) -> int:
+    import argparse
+    from sqlalchemy.engine import make_url
+
+    from .db import DATABASE_URL
+    from .sharding import shard_count, shard_url
+
+    parser = argparse.ArgumentParser(prog="python -m app.backup", description="Online SQLite snapshot.")
+    parser.add_argument("output", help="target file; gzip-compressed when it ends in .gz")
+    parser.add_argument("--database-url", default=None, help=f"default: {DATABASE_URL}")
+    parser.add_argument("--method", choices=METHODS, default="backup")
+    parser.add_argument("--shard", type=int, help="with SHARD_COUNT > 1: the shard to copy")
+    args = parser.parse_args(argv)
+
+    url = args.database_url or DATABASE_URL
+    count = shard_count()
+    if args.shard is not None:
+        if not 0 <= args.shard < count:
+            parser.error(f"--shard must be in 0..{count - 1} (SHARD_COUNT={count})")
+        url = shard_url(url, args.shard)
+    elif count > 1 and args.database_url is None:
+        parser.error(f"SHARD_COUNT={count}: a snapshot holds one shard; run once per --shard 0..{count - 1}")
+
+    source = sqlite3.connect(make_url(url).database)
+    try:
+        if not args.output.endswith(".gz"):
+            snapshot(source, args.output, args.method)
+            return 0
+        path = snapshot_to_tempfile(source, args.method)
+    finally:
+        source.close()
+
+    with open(args.output, "wb") as out:
+        for chunk in iter_gzip(path):
+            out.write(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
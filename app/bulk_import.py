@@ -0,0 +1,305 @@
+# app/bulk_import.py
+"""
+Bulk import of historical events straight into the SQLite `events` table.
+
+Usage:
+    python -m app.bulk_import events.ndjson [more.csv ...] [--batch-size N]
+                              [--defer-indexes] [--fast] [--database-url URL]
+
+Input records have the same shape as the POST /v1/events body, with an optional
+received_at (ISO-8601) to keep the original submission time:
+
+    NDJSON  {"source": "...", "received_at": "...", "payload": {"stid": ..., "exnum": ..., "table": {...}}}
+    CSV     columns source, received_at and either `payload` (JSON) or
+            stid, exnum, table (JSON) plus any extra payload columns
+
+Each batch is inserted with a single executemany inside one transaction, and the
+file position is written to `bulk_import_checkpoints` in that same transaction,
+so an interrupted import can simply be re-run and resumes where it stopped.
+
+With SHARD_COUNT > 1 (app/sharding.py) every record goes to the shard file of
+its SHARD_KEY, as POST /v1/events would send it. Each shard keeps its own
+checkpoint, committed with its rows; a run interrupted between two shards'
+commits resumes from the earliest one and skips what the others already hold.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Iterator, Optional, Sequence, Union
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from .db import Base, DATABASE_URL
+from .models import Event
+from .sharding import ShardRouter, shard_count, shard_url
+
+REQUIRED_KEYS = ("stid", "exnum", "table")
+DEFAULT_BATCH_SIZE = 50_000
+
+EVENTS = Event.__table__.name
+INSERT_SQL = (
+    f"INSERT INTO {EVENTS} (received_at, source, payload) "
+    "VALUES (COALESCE(?, CURRENT_TIMESTAMP), ?, ?)"
+)
+
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS bulk_import_checkpoints (
+    source_file TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    imported INTEGER NOT NULL,
+    rejected INTEGER NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+# Index definitions dropped by --defer-indexes; kept until they are rebuilt so
+# a crashed run does not lose them.
+DEFERRED_INDEXES_DDL = """
+CREATE TABLE IF NOT EXISTS bulk_import_deferred_indexes (
+    name TEXT PRIMARY KEY,
+    sql TEXT NOT NULL
+)
+"""
+_CREATE_INDEX_RE = re.compile(r"^CREATE\s+(UNIQUE\s+)?INDEX", re.IGNORECASE)
+
+
+class BadRecord(ValueError):
+    pass
+
+
+def _received_at(value: Optional[str]) -> Optional[str]:
+    """Normalize to the naive-UTC text format SQLAlchemy uses for DateTime on SQLite."""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise BadRecord(f"received_at must be an ISO 8601 string, not {value!r}")
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise BadRecord(f"invalid received_at {value!r}")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _row(source, received_at, payload) -> tuple:
+    if not isinstance(payload, dict):
+        raise BadRecord("payload must be a JSON object")
+    for key in REQUIRED_KEYS:
+        if key not in payload:
+            raise BadRecord(f"payload must include '{key}'")
+    if source is not None and not isinstance(source, str):
+        raise BadRecord(f"source must be a string, not {source!r}")
+    if source is not None and len(source) > 200:
+        raise BadRecord("source longer than 200 characters")
+    return (_received_at(received_at), source, json.dumps(payload))
+
+
+def _ndjson_records(path: str, position: int) -> Iterator[tuple[int, tuple, Optional[dict]]]:
+    """Yield (byte offset after the record, row, payload); position is a byte offset."""
+    with open(path, "rb") as f:
+        f.seek(position)
+        for line in f:
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+                if not isinstance(rec, dict):
+                    raise BadRecord("record must be a JSON object")
+                yield position, _row(rec.get("source"), rec.get("received_at"), rec.get("payload")), rec["payload"]
+            except ValueError as exc:
+                yield position, BadRecord(str(exc)), None
+
+
+def _csv_records(path: str, position: int) -> Iterator[tuple[int, tuple, Optional[dict]]]:
+    """Yield (records consumed, row, payload); position is a record count."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for rec in islice(csv.DictReader(f), position, None):
+            position += 1
+            try:
+                source = rec.pop("source", None) or None
+                received_at = rec.pop("received_at", None)
+                if "payload" in rec:
+                    payload = json.loads(rec["payload"])
+                else:
+                    payload = {k: v for k, v in rec.items() if k is not None}
+                    if "table" in payload:
+                        payload["table"] = json.loads(payload["table"])
+                yield position, _row(source, received_at, payload), payload
+            except ValueError as exc:
+                yield position, BadRecord(str(exc)), None
+
+
+def _detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def connect(database_url: str = DATABASE_URL) -> sqlite3.Connection:
+    """Open the target database (creating the schema) in autocommit mode."""
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise SystemExit(f"bulk import needs a file-backed SQLite DATABASE_URL, got {database_url!r}")
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(url.database, isolation_level=None)
+    conn.execute(CHECKPOINT_DDL)
+    conn.execute(DEFERRED_INDEXES_DDL)
+    return conn
+
+
+def relax_pragmas(conn: sqlite3.Connection) -> None:
+    """Trade durability for speed for the duration of the load."""
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def drop_indexes(conn: sqlite3.Connection) -> None:
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (EVENTS,),
+    ).fetchall()
+    conn.execute("BEGIN")
+    for name, sql in rows:
+        conn.execute("INSERT OR REPLACE INTO bulk_import_deferred_indexes (name, sql) VALUES (?, ?)", (name, sql))
+        conn.execute(f'DROP INDEX "{name}"')
+    conn.execute("COMMIT")
+
+
+def rebuild_indexes(conn: sqlite3.Connection) -> None:
+    rows = conn.execute("SELECT name, sql FROM bulk_import_deferred_indexes").fetchall()
+    conn.execute("BEGIN")
+    for name, sql in rows:
+        conn.execute(_CREATE_INDEX_RE.sub(r"\g<0> IF NOT EXISTS", sql, count=1))
+        conn.execute("DELETE FROM bulk_import_deferred_indexes WHERE name = ?", (name,))
+    conn.execute("COMMIT")
+
+
+def import_file(
+    conn: Union[sqlite3.Connection, Sequence[sqlite3.Connection]],
+    path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fmt: Optional[str] = None,
+    progress=None,
+    shard_for: Optional[Callable[[Optional[str], dict], int]] = None,
+) -> dict:
+    """
+    Import one file, resuming from its checkpoint. Returns the final counters.
+
+    With sharding, `conn` is one connection per shard and `shard_for(source,
+    payload)` (ShardRouter.shard_for_event) picks the shard of each record.
+    """
+    conns = [conn] if isinstance(conn, sqlite3.Connection) else list(conn)
+    key = os.path.abspath(path)
+    fmt = fmt or _detect_format(path)
+    checkpoints = [
+        c.execute(
+            "SELECT position, imported, rejected FROM bulk_import_checkpoints WHERE source_file = ?", (key,)
+        ).fetchone() or (0, 0, 0)
+        for c in conns
+    ]
+    stored_up_to = [cp[0] for cp in checkpoints]
+    imported = [cp[1] for cp in checkpoints]
+    position = min(stored_up_to)
+    rejected = max(cp[2] for cp in checkpoints if cp[0] == position)
+
+    records = _csv_records(path, position) if fmt == "csv" else _ndjson_records(path, position)
+    started, resumed_at = time.monotonic(), sum(imported)
+    done = False
+    while not done:
+        batches = [[] for _ in conns]
+        size = 0
+        for position, row, payload in records:
+            if isinstance(row, BadRecord):
+                rejected += 1
+                if progress:
+                    progress(f"{path}: skipped record ending at {position}: {row}")
+                continue
+            shard = shard_for(row[1], payload) if shard_for else 0
+            if position <= stored_up_to[shard]:
+                continue  # committed to its shard before an interruption
+            batches[shard].append(row)
+            size += 1
+            if size >= batch_size:
+                break
+        else:
+            done = True
+
+        for shard, (c, batch) in enumerate(zip(conns, batches)):
+            if position <= stored_up_to[shard]:
+                continue  # this shard's checkpoint is already further along
+            c.execute("BEGIN")
+            c.executemany(INSERT_SQL, batch)
+            c.execute(
+                "INSERT OR REPLACE INTO bulk_import_checkpoints (source_file, position, imported, rejected, updated_at) "
+                "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+                (key, position, imported[shard] + len(batch), rejected),
+            )
+            c.execute("COMMIT")
+            imported[shard] += len(batch)
+            stored_up_to[shard] = position
+
+        if progress:
+            elapsed = time.monotonic() - started
+            rate = (sum(imported) - resumed_at) / elapsed if elapsed > 0 else 0.0
+            progress(f"{path}: {sum(imported)} imported, {rejected} rejected ({rate:,.0f} rows/s)")
+
+    return {"file": path, "imported": sum(imported), "rejected": rejected, "position": position}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.bulk_import", description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help="NDJSON or CSV files to import")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="with SHARD_COUNT > 1: shard 0")
+    parser.add_argument("--format", choices=("ndjson", "csv"), help="default: from file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--defer-indexes", action="store_true", help="drop secondary indexes during the load")
+    parser.add_argument("--fast", action="store_true", help="synchronous=OFF and a large page cache during the load")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    def progress(msg):
+        print(msg, file=sys.stderr, flush=True)
+
+    count = shard_count()
+    urls = [shard_url(args.database_url, i) for i in range(count)] if count > 1 else [args.database_url]
+    router = None
+    if count > 1:
+        # engines are only used for the shard count; nothing connects through them
+        router = ShardRouter([create_engine(url) for url in urls], os.getenv("SHARD_KEY", "source").lower())
+    conns = [connect(url) for url in urls]
+    try:
+        for conn in conns:
+            if args.fast:
+                relax_pragmas(conn)
+            if args.defer_indexes:
+                drop_indexes(conn)
+        for path in args.files:
+            result = import_file(
+                conns, path, args.batch_size, args.format, None if args.quiet else progress,
+                shard_for=router.shard_for_event if router else None,
+            )
+            print(json.dumps(result))
+        for conn in conns:
+            # also rebuilds indexes left dropped by an earlier, interrupted run
+            rebuild_indexes(conn)
+            conn.execute("PRAGMA optimize")
+    finally:
+        for conn in conns:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
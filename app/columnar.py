@@ -0,0 +1,172 @@
+# app/columnar.py
+"""
+Columnar storage of payload.table in the `event_cells` child table.
+
+When TABLE_CELLS=1, create_event also writes one typed row per table cell,
+keyed by (event_id, column_name, row_index) and indexed by (exnum, column_name).
+Reading a few columns of one exercise across many submissions then touches only
+those cells instead of decoding every full payload document.
+
+Table shapes (same as app/limits.table_shape):
+  {"col": value, ...}          -> row 0 of each column
+  {"col": [v0, v1, ...], ...}  -> one row per list item
+  [{"col": value}, ...]        -> one row per item
+  [[v0, v1], ...]              -> columns named "0", "1", ...
+
+Events stored before the flag was enabled (or loaded by app.bulk_import) are
+filled in with (every shard when SHARD_COUNT > 1, see app/sharding.py):
+    python -m app.columnar [--database-url URL]
+"""
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import desc, func, insert, select
+from sqlalchemy.orm import Session
+
+from .history import rebuild_payloads
+from .models import Event, EventCell
+
+
+def cells_enabled() -> bool:
+    return os.getenv("TABLE_CELLS", "0").lower() in ("1", "true", "yes")
+
+
+def table_cells(table: Any) -> Iterator[tuple[str, int, Any]]:
+    """Yield (column_name, row_index, value) for every cell of a payload table."""
+    if isinstance(table, dict):
+        for name, value in table.items():
+            if isinstance(value, list):
+                for row, item in enumerate(value):
+                    yield str(name), row, item
+            else:
+                yield str(name), 0, value
+    elif isinstance(table, list):
+        for row, item in enumerate(table):
+            if isinstance(item, dict):
+                for name, value in item.items():
+                    yield str(name), row, value
+            elif isinstance(item, list):
+                for col, value in enumerate(item):
+                    yield str(col), row, value
+            else:
+                yield "0", row, item
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def cell_rows(event_id: int, payload: dict) -> list[dict]:
+    exnum, stid = _text(payload.get("exnum")), _text(payload.get("stid"))
+    return [
+        {"event_id": event_id, "column_name": name, "row_index": row, "exnum": exnum, "stid": stid, "value": value}
+        for name, row, value in table_cells(payload.get("table"))
+    ]
+
+
+def store_cells(db: Session, event_id: int, payload: dict) -> None:
+    """Add the cells of one event to the current transaction."""
+    rows = cell_rows(event_id, payload)
+    if rows:
+        db.execute(insert(EventCell), rows)
+
+
+def fetch_columns(
+    db: Session,
+    exnum: str,
+    columns: list[str],
+    stid: Optional[str] = None,
+    latest_only: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[dict]:
+    """
+    Selected columns of many events of one exercise, newest event first:
+      [{"id": ..., "stid": ..., "columns": {"col": [row0, row1, ...]}}, ...]
+    With latest_only, only the most recent event of each student is returned.
+    """
+    match = (EventCell.exnum == exnum, EventCell.column_name.in_(columns))
+    if stid is not None:
+        match += (EventCell.stid == stid,)
+
+    if latest_only:
+        ids = select(func.max(EventCell.event_id).label("event_id")).where(*match).group_by(EventCell.stid)
+    else:
+        ids = select(EventCell.event_id).where(*match).distinct()
+    ids = ids.subquery()
+    page = [
+        event_id for (event_id,) in db.execute(
+            select(ids.c.event_id).order_by(desc(ids.c.event_id)).limit(limit).offset(offset)
+        )
+    ]
+    if not page:
+        return []
+
+    cells = db.execute(
+        select(EventCell.event_id, EventCell.stid, EventCell.column_name, EventCell.value)
+        .where(EventCell.event_id.in_(page), EventCell.column_name.in_(columns))
+        .order_by(EventCell.event_id, EventCell.column_name, EventCell.row_index)
+    )
+    out = {event_id: {"id": event_id, "stid": None, "columns": defaultdict(list)} for event_id in page}
+    for event_id, cell_stid, name, value in cells:
+        out[event_id]["stid"] = cell_stid
+        out[event_id]["columns"][name].append(value)
+    return [out[event_id] for event_id in page]
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Write cells for events that have none yet. Returns the number of events filled."""
+    filled = 0
+    last_id = 0
+    has_cells = select(EventCell.event_id).where(EventCell.event_id == Event.id).exists()
+    while True:
+        batch = db.execute(
+            select(Event.id, Event.payload)
+            .where(Event.id > last_id, ~has_cells)
+            .order_by(Event.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return filled
+        # events stored as deltas (see app/history.py) have a null payload
+        rebuilt = rebuild_payloads(db, [event_id for event_id, payload in batch if payload is None])
+        for event_id, payload in batch:
+            payload = rebuilt.get(event_id, payload)
+            if isinstance(payload, dict):
+                store_cells(db, event_id, payload)
+        db.commit()
+        filled += len(batch)
+        last_id = batch[-1][0]
+
+
+def main(argv=None) -> int:
+    import argparse
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from .db import Base, DATABASE_URL
+    from .sharding import shard_count, shard_url
+
+    parser = argparse.ArgumentParser(prog="python -m app.columnar", description="Backfill event_cells.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="with SHARD_COUNT > 1: shard 0")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    count = shard_count()
+    urls = [shard_url(args.database_url, i) for i in range(count)] if count > 1 else [args.database_url]
+    filled = 0
+    for url in urls:
+        # cells live next to their events, keyed by the shard-local event id
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            filled += backfill(db, args.batch_size)
+        engine.dispose()
+    print(f"filled {filled} events", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
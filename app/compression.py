@@ -0,0 +1,142 @@
+# app/compression.py
+"""
+Response compression negotiated from Accept-Encoding.
+
+zstd is used when the client accepts it and the optional `zstandard` package is
+installed, gzip otherwise. Responses smaller than COMPRESSION_MIN_SIZE bytes,
+paths listed in COMPRESSION_EXCLUDE (default /health) and responses that are
+already encoded or compressed (e.g. the gzip backup download) pass through
+untouched. Streaming responses are compressed chunk by chunk as they are produced.
+
+Levels: COMPRESSION_GZIP_LEVEL (1-9, default 6), COMPRESSION_ZSTD_LEVEL
+(1-22, default 3).
+"""
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+# payloads that are already compressed; re-compressing only costs CPU
+COMPRESSED_MEDIA_TYPES = frozenset({
+    "application/gzip", "application/zstd", "application/zip", "application/x-xz",
+})
+
+
+def accepted_encodings(header: str) -> dict:
+    """{"gzip": 1.0, "zstd": 0.5, ...} from an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(","):
+        name, *params = [p.strip() for p in item.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[name.lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    best = max(candidates, key=lambda name: accepted.get(name, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=None, gzip_level=None, zstd_level=None, exclude_paths=None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(
+            os.getenv("COMPRESSION_MIN_SIZE", DEFAULT_MIN_SIZE))
+        self.gzip_level = gzip_level if gzip_level is not None else int(
+            os.getenv("COMPRESSION_GZIP_LEVEL", DEFAULT_GZIP_LEVEL))
+        self.zstd_level = zstd_level if zstd_level is not None else int(
+            os.getenv("COMPRESSION_ZSTD_LEVEL", DEFAULT_ZSTD_LEVEL))
+        if exclude_paths is None:
+            exclude_paths = [p for p in os.getenv("COMPRESSION_EXCLUDE", "/health").split(",") if p]
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self, encoding, send)(self.app, scope, receive)
+
+
+class _CompressingResponder:
+    def __init__(self, config: CompressionMiddleware, encoding: str, send):
+        self.config = config
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, app, scope, receive):
+        await app(scope, receive, self.on_send)
+
+    def _new_compressor(self):
+        if self.encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.config.zstd_level).compressobj()
+        return zlib.compressobj(self.config.gzip_level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+
+    async def on_send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            self.passthrough = "content-encoding" in headers or media_type in COMPRESSED_MEDIA_TYPES
+            if self.passthrough:
+                await self.send(message)
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            # first body chunk: decide whether to compress at all
+            if not more_body and len(body) < self.config.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.compressor = self._new_compressor()
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                out = self.compressor.compress(body)
+            else:
+                out = self.compressor.compress(body) + self.compressor.flush()
+                headers["Content-Length"] = str(len(out))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": out, "more_body": more_body})
+            return
+
+        out = self.compressor.compress(body)
+        if not more_body:
+            out += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": out, "more_body": more_body})
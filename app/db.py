@@ -1,16 +1,75 @@
-from sqlalchemy import create_engine
+import os
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-DATABASE_URL = "sqlite:////data/app.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:////data/app.db")
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Lets the maintenance scheduler reclaim free pages in small slices.
+    # Only takes effect for a fresh database (existing files need one VACUUM).
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Readers no longer block the writer; checkpoints are run by app/maintenance.py
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.close()
+
+def make_engine(url: str, read_only: bool = False) -> Engine:
+    sqlite = url.startswith("sqlite")
+    # check_same_thread=False is typical for SQLite with threaded servers;
+    # timeout is how long a writer waits for the lock before "database is locked"
+    connect_args = {
+        "check_same_thread": False,
+        "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "5")),
+    }
+    engine = create_engine(
+        url,
+        connect_args=connect_args if sqlite else {},
+        pool_pre_ping=True,
+    )
+    if sqlite and not read_only:
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+def get_engine() -> Engine:
+    """
+    The application engine, created on first use rather than at import time,
+    so importing the app (tests, CLIs, worker start-up) never touches the
+    database file.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = make_engine(DATABASE_URL)
+    return _engine
+
+def use_database(url: str, read_only: bool = False) -> None:
+    """
+    Point the application at another database (used by read replicas to switch
+    to a newer snapshot). Sessions already open keep their connection; new
+    sessions use the new engine.
+    """
+    global _engine
+    engine = make_engine(url, read_only=read_only)
+    with _engine_lock:
+        old, _engine = _engine, engine
+    if old is not None:
+        old.dispose()
 
-# check_same_thread=False is typical for SQLite with threaded servers
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    pool_pre_ping=True,
-)
+def __getattr__(name):
+    # `from app.db import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# bound per session: SessionLocal(bind=get_engine())
+SessionLocal = sessionmaker(autoflush=False, autocommit=False)
 
 class Base(DeclarativeBase):
     pass
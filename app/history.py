@@ -0,0 +1,191 @@
+# app/history.py
+"""
+Delta-encoded storage of resubmissions per (stid, exnum) chain.
+
+When DELTA_HISTORY=1, create_event appends the new event to its chain in
+`event_versions`: version 1, every DELTA_SNAPSHOT_EVERY-th version, and any
+version whose patch would be larger than the payload itself are snapshots and
+keep their full payload in events.payload. Every other version is stored only
+as a JSON patch (app/jsonpatch.py) against the previous version: its
+events.payload is replaced by JSON null and the patch goes to
+event_versions.doc. A chain of n versions therefore stores about
+n / DELTA_SNAPSHOT_EVERY full payloads plus n small patches.
+
+rebuild_payloads() restores full payloads from the nearest snapshot; the list
+and lookup (app/storage.py), search (app/search.py) and the event_cells
+backfill (app/columnar.py) call it for rows whose payload is null. The search
+index and event_cells are written from the full payload at insert time, so
+neither needs rebuilding on reads. GET /v1/events/{stid}/history rebuilds a
+window of versions and, with diffs=true, returns the patches instead.
+
+Events stored while DELTA_HISTORY was off (or before this layout, when every
+event kept its full payload) are read as they are.
+"""
+import json
+import os
+from typing import Iterable, Optional
+
+from sqlalchemy import JSON, and_, func, select, update
+from sqlalchemy.orm import Session, aliased
+
+from . import jsonpatch
+from .models import Event, EventVersion
+
+DEFAULT_SNAPSHOT_EVERY = 10
+
+
+def history_enabled() -> bool:
+    return os.getenv("DELTA_HISTORY", "0").lower() in ("1", "true", "yes")
+
+
+def _chain(stid: str, exnum: str):
+    return (EventVersion.stid == stid, EventVersion.exnum == exnum)
+
+
+def chain_head(stid: str, exnum: str):
+    """Scalar subquery: event id of the newest version in a chain (NULL if none)."""
+    return (
+        select(EventVersion.event_id)
+        .where(*_chain(stid, exnum))
+        .order_by(EventVersion.version.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def rebuild_payloads(db: Session, event_ids: Iterable[int]) -> dict[int, dict]:
+    """
+    Full payloads of versioned events, by event id, each rebuilt from its
+    nearest snapshot in one query. Ids without a version are left out.
+    """
+    event_ids = list(event_ids)
+    if not event_ids:
+        return {}
+    target = aliased(EventVersion)
+    snapshot = aliased(EventVersion)
+    base = (
+        select(func.max(snapshot.version))
+        .where(
+            snapshot.stid == target.stid,
+            snapshot.exnum == target.exnum,
+            snapshot.is_snapshot,
+            snapshot.version <= target.version,
+        )
+        .scalar_subquery()
+    )
+    targets = (
+        select(target.event_id, target.stid, target.exnum, target.version, base.label("base"))
+        .where(target.event_id.in_(event_ids))
+        .subquery()
+    )
+    steps = db.connection().execute(
+        select(targets.c.event_id, EventVersion.doc, Event.payload)
+        .select_from(targets)
+        .join(
+            EventVersion,
+            and_(
+                EventVersion.stid == targets.c.stid,
+                EventVersion.exnum == targets.c.exnum,
+                EventVersion.version.between(targets.c.base, targets.c.version),
+            ),
+        )
+        .join(Event, Event.id == EventVersion.event_id)
+        .order_by(targets.c.event_id, EventVersion.version)
+    )
+    payloads = {}
+    for event_id, doc, payload in steps:
+        # snapshots (and events stored before delta storage) have their payload
+        payloads[event_id] = payload if payload is not None else jsonpatch.apply(payloads[event_id], doc)
+    return payloads
+
+
+def record_version(db: Session, event_id: int, payload: dict) -> EventVersion:
+    """
+    Append an event to its chain, replacing its stored payload by a patch
+    unless it becomes a snapshot. Must run after the event INSERT has been
+    flushed, so the transaction already holds the SQLite write lock and the
+    version number cannot race with another writer.
+    """
+    stid, exnum = str(payload.get("stid")), str(payload.get("exnum"))
+    previous = db.execute(
+        select(EventVersion.event_id, EventVersion.version)
+        .where(*_chain(stid, exnum))
+        .order_by(EventVersion.version.desc())
+        .limit(1)
+    ).first()
+
+    version = previous.version + 1 if previous else 1
+    snapshot_every = int(os.getenv("DELTA_SNAPSHOT_EVERY", DEFAULT_SNAPSHOT_EVERY))
+    is_snapshot = previous is None or (version - 1) % snapshot_every == 0
+    doc = None  # a snapshot's payload stays in events
+    if not is_snapshot:
+        patch = jsonpatch.diff(rebuild_payloads(db, [previous.event_id])[previous.event_id], payload)
+        if len(json.dumps(patch)) < len(json.dumps(payload)):
+            doc = patch
+            # Core update: the caller's Event instance keeps the full payload
+            db.execute(update(Event.__table__).where(Event.id == event_id).values(payload=JSON.NULL))
+        else:
+            is_snapshot = True
+
+    row = EventVersion(event_id=event_id, stid=stid, exnum=exnum, version=version, is_snapshot=is_snapshot, doc=doc)
+    db.add(row)
+    return row
+
+
+def load_history(
+    db: Session,
+    stid: str,
+    exnum: str,
+    limit: int = 20,
+    until: Optional[int] = None,
+    diffs: bool = False,
+) -> list[dict]:
+    """
+    The `limit` versions up to `until` (default: latest), oldest first. With
+    diffs=True the first entry carries the full payload and later entries only
+    the patch against the entry before them.
+    """
+    chain = _chain(stid, exnum)
+    if until is None:
+        until = db.execute(select(EventVersion.version).where(*chain).order_by(EventVersion.version.desc())).scalar()
+        if until is None:
+            return []
+    first = max(1, until - limit + 1)
+    base = db.execute(
+        select(EventVersion.version)
+        .where(*chain, EventVersion.is_snapshot, EventVersion.version <= first)
+        .order_by(EventVersion.version.desc())
+    ).scalar()
+    if base is None:
+        return []
+
+    rows = db.execute(
+        select(
+            EventVersion.event_id,
+            EventVersion.version,
+            EventVersion.is_snapshot,
+            EventVersion.doc,
+            Event.received_at,
+            Event.payload,
+        )
+        .join(Event, Event.id == EventVersion.event_id)
+        .where(*chain, EventVersion.version.between(base, until))
+        .order_by(EventVersion.version)
+    ).all()
+
+    out = []
+    current = None
+    for row in rows:
+        previous = current
+        current = row.payload if row.payload is not None else jsonpatch.apply(current, row.doc)
+        if row.version < first:
+            continue
+        entry = {"event_id": row.event_id, "version": row.version, "received_at": row.received_at.isoformat()}
+        if not diffs or not out:
+            entry["payload"] = current
+        elif row.is_snapshot:
+            entry["patch"] = jsonpatch.diff(previous, current)
+        else:
+            entry["patch"] = row.doc
+        out.append(entry)
+    return out
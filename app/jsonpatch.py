@@ -0,0 +1,82 @@
+# app/jsonpatch.py
+"""
+Minimal JSON Patch (RFC 6902) support: add/remove/replace diffs and apply.
+
+diff() walks dicts key by key and lists index by index, so a resubmission that
+changes one table cell becomes a single small "replace" operation.
+"""
+import copy
+from typing import Any
+
+
+def _escape(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _same(a: Any, b: Any) -> bool:
+    # True == 1 in Python but not in JSON
+    return type(a) is type(b) and a == b
+
+
+def diff(old: Any, new: Any, path: str = "") -> list[dict]:
+    """Operations that turn `old` into `new`."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                ops.extend(diff(old[key], value, f"{path}/{_escape(key)}"))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(diff(old[i], new[i], f"{path}/{i}"))
+        for i in range(common, len(new)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        return ops
+
+    if _same(old, new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply(doc: Any, ops: list[dict]) -> Any:
+    """Return a copy of `doc` with the operations applied."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if op["op"] not in ("add", "remove", "replace"):
+            raise ValueError(f"unsupported patch operation {op['op']!r}")
+        if op["path"] == "":
+            doc = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [_unescape(t) for t in op["path"].split("/")[1:]]
+        target = doc
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+
+        if isinstance(target, list):
+            index = len(target) if last == "-" else int(last)
+            if op["op"] == "add":
+                target.insert(index, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del target[index]
+            else:
+                target[index] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                del target[last]
+            else:
+                target[last] = copy.deepcopy(op["value"])
+    return doc
@@ -0,0 +1,153 @@
+# app/limits.py
+"""
+Request body limits for the ingest path.
+
+The body is read from the stream with a running byte budget, its nesting depth
+is checked with a cheap scan over the raw bytes, and the key budget is enforced
+from inside json.loads - so a pathological upload is rejected before the full
+document (or the Pydantic model) is ever built.
+
+All limits are read from the environment on every request, like API_KEY.
+"""
+import json
+import os
+import re
+from itertools import accumulate
+from typing import Any
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from .schemas import EventIn, EventBatchIn
+
+DEFAULT_MAX_BODY_BYTES = 1024 * 1024  # matches client_max_body_size in nginx.conf
+DEFAULT_MAX_DEPTH = 32
+DEFAULT_MAX_KEYS = 10_000
+DEFAULT_MAX_TABLE_ROWS = 10_000
+DEFAULT_MAX_TABLE_COLUMNS = 256
+DEFAULT_MAX_BATCH_EVENTS = 1000
+
+# JSON string literals (with escapes); stripped before counting brackets
+_STRING_RE = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_NON_BRACKETS = bytes(b for b in range(256) if b not in b"{}[]")
+_DEPTH_STEP = {ord("{"): 1, ord("["): 1, ord("}"): -1, ord("]"): -1}
+
+
+class _TooManyKeys(Exception):
+    pass
+
+
+def _limit(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def json_depth(raw: bytes) -> int:
+    """Maximum object/array nesting depth of a JSON document, without parsing it."""
+    brackets = _STRING_RE.sub(b"", raw).translate(None, _NON_BRACKETS)
+    if not brackets:
+        return 0
+    return max(accumulate(map(_DEPTH_STEP.__getitem__, brackets)))
+
+
+def table_shape(table: Any) -> tuple[int, int]:
+    """
+    (rows, columns) of a payload table. Supported shapes:
+      {"col": value, ...}          -> 1 row
+      {"col": [v0, v1, ...], ...}  -> len of the longest column
+      [{"col": value}, ...]        -> one row per item
+      [[v0, v1], ...]              -> one row per item
+    """
+    if isinstance(table, dict):
+        rows = max((len(v) if isinstance(v, list) else 1 for v in table.values()), default=0)
+        return rows, len(table)
+    if isinstance(table, list):
+        columns = max((len(r) if isinstance(r, (dict, list)) else 1 for r in table), default=0)
+        return len(table), columns
+    return 1, 1
+
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _loads_with_key_budget(raw: bytes, max_keys: int) -> Any:
+    seen = 0
+
+    def hook(pairs):
+        nonlocal seen
+        seen += len(pairs)
+        if seen > max_keys:
+            raise _TooManyKeys
+        return dict(pairs)
+
+    return json.loads(raw, object_pairs_hook=hook)
+
+
+def _check_table(payload: Any) -> None:
+    if isinstance(payload, dict) and "table" in payload:
+        rows, columns = table_shape(payload["table"])
+        max_rows = _limit("MAX_TABLE_ROWS", DEFAULT_MAX_TABLE_ROWS)
+        max_columns = _limit("MAX_TABLE_COLUMNS", DEFAULT_MAX_TABLE_COLUMNS)
+        if rows > max_rows:
+            raise HTTPException(status_code=422, detail=f"payload.table has more than {max_rows} rows")
+        if columns > max_columns:
+            raise HTTPException(status_code=422, detail=f"payload.table has more than {max_columns} columns")
+
+
+async def _read_limited_json(request: Request) -> Any:
+    raw = await _read_body(request, _limit("MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES))
+
+    max_depth = _limit("MAX_JSON_DEPTH", DEFAULT_MAX_DEPTH)
+    if json_depth(raw) > max_depth:
+        raise HTTPException(status_code=422, detail=f"JSON nesting deeper than {max_depth} levels")
+
+    max_keys = _limit("MAX_JSON_KEYS", DEFAULT_MAX_KEYS)
+    try:
+        return _loads_with_key_budget(raw, max_keys)
+    except _TooManyKeys:
+        raise HTTPException(status_code=422, detail=f"JSON body has more than {max_keys} keys")
+    except ValueError as exc:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body",), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(exc)}}]
+        )
+
+
+def _validate(model, data: Any):
+    try:
+        return model.model_validate(data)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in exc.errors(include_url=False)]
+        )
+
+
+async def read_event_body(request: Request) -> EventIn:
+    """FastAPI dependency: parse the POST /v1/events body under the configured limits."""
+    data = await _read_limited_json(request)
+    _check_table(data.get("payload") if isinstance(data, dict) else None)
+    return _validate(EventIn, data)
+
+
+async def read_event_batch(request: Request) -> EventBatchIn:
+    """FastAPI dependency: parse a POST /v1/events/batch body under the configured limits."""
+    data = await _read_limited_json(request)
+    events = data.get("events") if isinstance(data, dict) else None
+    if isinstance(events, list):
+        max_events = _limit("MAX_BATCH_EVENTS", DEFAULT_MAX_BATCH_EVENTS)
+        if len(events) > max_events:
+            raise HTTPException(status_code=413, detail=f"Batch has more than {max_events} events")
+        for item in events:
+            _check_table(item.get("payload") if isinstance(item, dict) else None)
+    return _validate(EventBatchIn, data)
@@ -1,15 +1,86 @@
 # app/main.py
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
 from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.exc import OperationalError
+
+from .db import Base, get_engine, SessionLocal
+from .schemas import EventIn, EventOut, EventBatchIn, EventBatchOut, EventSearchHit, EventColumns, EventVersionOut
+from .limits import read_event_body, read_event_batch
+from .storage import EventStore, store_for
+from .rows import EventsResponse
+from .sharding import ShardRouter, get_router, shard_count
+from .quotas import SourceQuotas
+from .search import search_events
+from .columnar import cells_enabled, store_cells, fetch_columns
+from .history import history_enabled, record_version, load_history
+from .maintenance import MaintenanceScheduler, RequestRate, RequestRateMiddleware
+from .compression import CompressionMiddleware
+from .replication import (
+    PRIMARY, REPLICA, SnapshotFollower, SnapshotPublisher, ReplicationLagMiddleware,
+    replication_role, replication_status, require_primary,
+)
+from .security import require_api_key, require_admin_key
 
-from .db import Base, engine, SessionLocal
-from .models import Event
-from .schemas import EventIn, EventOut
-from .security import require_api_key
+logger = logging.getLogger(__name__)
 
-# Create tables (simple approach; for production consider migrations)
-Base.metadata.create_all(bind=engine)
+request_rate = RequestRate()
+maintenance = MaintenanceScheduler(get_engine, request_rate)
+publisher = SnapshotPublisher(get_engine)
+follower = SnapshotFollower()
+source_quotas = SourceQuotas()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    role = replication_role()
+    # Snapshots only cover DATABASE_URL (shard 0): with sharding, replicas
+    # would silently miss the other shards' events and serve local ids.
+    sharded = shard_count() > 1
+    if role == PRIMARY and sharded:
+        raise RuntimeError("REPLICATION_ROLE=primary cannot be combined with SHARD_COUNT > 1")
+    if role == REPLICA and sharded:
+        # never ready: every /v1/ request gets 503 and nginx retries it on the primary
+        logger.error("SHARD_COUNT > 1: not following snapshots, this replica serves no reads")
+        yield
+        return
+    if role == REPLICA:
+        # read-only: serve the primary's snapshots (see app/replication.py)
+        try:
+            await asyncio.to_thread(follower.tick)
+        except Exception:
+            pass  # the polling loop retries and records the error
+        follower.start()
+        yield
+        await follower.stop()
+        return
+
+    # Create tables (simple approach; for production consider migrations).
+    # Done at start-up rather than import so importing the app stays cheap.
+    Base.metadata.create_all(bind=get_engine())
+    maintenance.start()
+    router = get_router()
+    shard_maintenance = []
+    if router is not None:
+        for engine in router.engines[1:]:
+            Base.metadata.create_all(bind=engine)
+            shard_maintenance.append(MaintenanceScheduler(lambda engine=engine: engine, request_rate))
+            shard_maintenance[-1].start()
+    if role == PRIMARY:
+        publisher.start()
+    yield
+    await publisher.stop()
+    for scheduler in shard_maintenance:
+        await scheduler.stop()
+    await maintenance.stop()
 
 app = FastAPI(
     title="SQLite Ingestion Service",
@@ -17,15 +88,52 @@ app = FastAPI(
     docs_url=None,        # disable Swagger UI in production
     redoc_url=None,
     openapi_url=None,
+    lifespan=lifespan,
 )
+# feeds the idle detection of the maintenance scheduler
+app.add_middleware(RequestRateMiddleware, rate=request_rate)
+# gzip/zstd for large responses (see app/compression.py)
+app.add_middleware(CompressionMiddleware)
+# replicas: X-Replication-Lag header, 503 until the first snapshot
+app.add_middleware(ReplicationLagMiddleware, follower=follower)
+
+@app.exception_handler(OperationalError)
+async def database_busy(request, exc: OperationalError):
+    # SQLITE_BUSY after SQLITE_BUSY_TIMEOUT: the write lock stayed taken; a
+    # retry usually succeeds, so answer 503 rather than 500
+    if "database is locked" in str(exc.orig) or "database is busy" in str(exc.orig):
+        return JSONResponse(
+            {"detail": "Database is busy, retry later"}, status_code=503, headers={"Retry-After": "1"}
+        )
+    raise exc
 
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
 
+def get_store(db: Session = Depends(get_db)) -> EventStore:
+    return store_for(db)
+
+def get_write_store(
+    body: EventIn = Depends(read_event_body),
+    router: Optional[ShardRouter] = Depends(get_router),
+    db: Session = Depends(get_db),
+):
+    """The store a new event goes to: the shard of its key when sharding is on."""
+    if router is None:
+        yield store_for(db)
+    else:
+        with router.store(router.shard_for_event(body.source, body.payload)) as store:
+            yield store
+
+def require_sqlite(store: EventStore = Depends(get_store)) -> EventStore:
+    if not store.sqlite_features:
+        raise HTTPException(status_code=501, detail="Not available with this storage backend")
+    return store
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -33,8 +141,20 @@ def health():
 # ----------------------------
 # CREATE (POST) - store payload
 # ----------------------------
-@app.post("/v1/events", response_model=EventOut, dependencies=[Depends(require_api_key)])
-def create_event(body: EventIn, db: Session = Depends(get_db)):
+def _require_payload_keys(payload: dict, where: str = "payload") -> None:
+    # Optional: enforce required keys inside payload
+    for key in ("stid", "exnum", "table"):
+        if key not in payload:
+            raise HTTPException(status_code=422, detail=f"{where} must include '{key}'")
+
+def _after_insert(db: Session, event_id: int, payload: dict) -> None:
+    if cells_enabled():
+        store_cells(db, event_id, payload)
+    if history_enabled():
+        record_version(db, event_id, payload)
+
+@app.post("/v1/events", response_model=EventOut, dependencies=[Depends(require_api_key), Depends(require_primary)])
+def create_event(body: EventIn = Depends(read_event_body), store: EventStore = Depends(get_write_store)):
     """
     Expected body:
     {
@@ -45,53 +165,212 @@ def create_event(body: EventIn, db: Session = Depends(get_db)):
         "table": {...}
       }
     }
+
+    The body is parsed by read_event_body, which enforces the size, depth,
+    key-count and table-shape limits (see app/limits.py) before validation.
     """
     if not isinstance(body.payload, dict):
         raise HTTPException(status_code=400, detail="payload must be a JSON object")
 
-    # Optional: enforce required keys inside payload
-    for key in ("stid", "exnum", "table"):
-        if key not in body.payload:
-            raise HTTPException(status_code=422, detail=f"payload must include '{key}'")
-
-    e = Event(source=body.source, payload=body.payload)
-    db.add(e)
-    db.commit()
+    _require_payload_keys(body.payload)
+    db = store.db
+    # per-source quota (see app/quotas.py)
+    with source_quotas.charged([body.source]):
+        e = store.add(body.source, body.payload)
+        _after_insert(db, e.id, body.payload)
+        db.commit()
     db.refresh(e)
 
+    # the stored payload may be a delta (see app/history.py); echo the one received
     return EventOut(
-        id=e.id,
+        id=store.public_id(e.id),
         received_at=e.received_at.isoformat(),
         source=e.source,
-        payload=e.payload,
+        payload=body.payload,
     )
 
+# ---------------------------------------
+# CREATE (POST) - batch of events
+# ---------------------------------------
+@app.post("/v1/events/batch", response_model=EventBatchOut, dependencies=[Depends(require_api_key), Depends(require_primary)])
+def create_events_batch(
+    body: EventBatchIn = Depends(read_event_batch),
+    store: EventStore = Depends(get_store),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
+    """
+    Expected body:
+    {
+      "events": [ {"source": ..., "payload": {...}}, ... ]
+    }
+
+    Inserts up to MAX_BATCH_EVENTS events in one transaction (COPY on
+    PostgreSQL, executemany on SQLite). All or nothing; when sharding is on,
+    there is one transaction per shard, committed after all inserts succeeded.
+    """
+    for i, item in enumerate(body.events):
+        _require_payload_keys(item.payload, where=f"events[{i}].payload")
+    with source_quotas.charged(item.source for item in body.events):
+        if router is None:
+            inserted = _insert_batch(store, body.events)
+            store.db.commit()
+            return EventBatchOut(inserted=inserted)
+
+        by_shard = defaultdict(list)
+        for item in body.events:
+            by_shard[router.shard_for_event(item.source, item.payload)].append(item)
+        with router.stores(sorted(by_shard)) as stores:
+            inserted = sum(_insert_batch(s, by_shard[s.shard_index]) for s in stores)
+            for s in stores:
+                s.db.commit()
+        return EventBatchOut(inserted=inserted)
+
+def _insert_batch(store: EventStore, items: list[EventIn]) -> int:
+    if cells_enabled() or history_enabled():
+        # the per-event hooks need each id
+        for item in items:
+            e = store.add(item.source, item.payload)
+            _after_insert(store.db, e.id, item.payload)
+        return len(items)
+    return store.add_many((item.source, item.payload) for item in items)
+
 # ----------------------------
 # READ - list events (paginated)
 # ----------------------------
 @app.get("/v1/events", response_model=list[EventOut], dependencies=[Depends(require_api_key)])
-def list_events(limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
+def list_events(
+    limit: int = 50,
+    offset: int = 0,
+    store: EventStore = Depends(get_store),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
     limit = max(1, min(limit, 200))
     offset = max(0, offset)
 
-    rows = (
-        db.query(Event)
-        .order_by(desc(Event.id))
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    # slim rows serialized straight from the stored JSON (see app/rows.py)
+    rows = store.recent(limit, offset) if router is None else router.recent(limit, offset)
+    return EventsResponse(rows)
+
+# ---------------------------------------------------------
+# READ - full-text search over payloads (FTS5)
+# (declared before /v1/events/{event_id} so "search" is not taken as an id)
+# ---------------------------------------------------------
+# SQLite errors raised by FTS5 for a malformed MATCH expression
+FTS_QUERY_ERRORS = ("fts5: syntax error", "unterminated string", "no such column", "unknown special query")
+
+@app.get("/v1/events/search", response_model=list[EventSearchHit], dependencies=[Depends(require_api_key)])
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = 50,
+    offset: int = 0,
+    store: EventStore = Depends(require_sqlite),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
+    """
+    Call example:
+      GET /v1/events/search?q=Valgrind
+      GET /v1/events/search?q=exnum:EX1 AND body:"Remove Non"
+
+    q uses FTS5 query syntax over the columns stid, exnum, source and body
+    (the JSON text of payload.table). Best matches come first.
+    """
+    limit = max(1, min(limit, 200))
+    offset = max(0, offset)
+
+    try:
+        if router is None:
+            hits = [(store, r) for r in search_events(store.db, q, limit, offset)]
+        else:
+            # best limit + offset of every shard, merged by rank
+            with router.stores() as stores:
+                hits = [(s, r) for s in stores for r in search_events(s.db, q, limit + offset, 0)]
+            hits = sorted(hits, key=lambda hit: hit[1].rank)[offset:offset + limit]
+    except OperationalError as exc:
+        # only a malformed q is the client's fault; anything else (e.g. a busy
+        # database, answered with 503 by database_busy) is passed on
+        if not any(message in str(exc.orig) for message in FTS_QUERY_ERRORS):
+            raise
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {exc.orig}")
 
     return [
-        EventOut(
-            id=e.id,
-            received_at=e.received_at.isoformat(),
-            source=e.source,
-            payload=e.payload,
+        EventSearchHit(
+            id=s.public_id(r.id),
+            received_at=r.received_at.isoformat(),
+            source=r.source,
+            payload=r.payload,
+            snippet=r.snippet,
+            rank=r.rank,
         )
-        for e in rows
+        for s, r in hits
     ]
 
+# ---------------------------------------------------------
+# READ - selected table columns across many events (event_cells)
+# ---------------------------------------------------------
+@app.get("/v1/events/columns", response_model=list[EventColumns], dependencies=[Depends(require_api_key)])
+def get_columns(
+    exnum: str = Query(..., min_length=1),
+    column: list[str] = Query(..., min_length=1, max_length=50),
+    stid: Optional[str] = None,
+    latest: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
+    """
+    Call example:
+      GET /v1/events/columns?exnum=EX1&column=Insert&column=Valgrind&latest=true
+
+    Returns the requested payload.table columns for the events of one exercise,
+    newest first; latest=true keeps only each student's most recent event.
+    Reads the event_cells table, filled when TABLE_CELLS=1 (see app/columnar.py).
+    """
+    limit = max(1, min(limit, 1000))
+    offset = max(0, offset)
+    if router is None:
+        return fetch_columns(db, exnum, column, stid=stid, latest_only=latest, limit=limit, offset=offset)
+    with router.exnum_store(exnum) as store:
+        rows = fetch_columns(store.db, exnum, column, stid=stid, latest_only=latest, limit=limit, offset=offset)
+    for row in rows:
+        row["id"] = store.public_id(row["id"])
+    return rows
+
+# ---------------------------------------------------------
+# READ - submission history of one (stid, exnum) chain
+# ---------------------------------------------------------
+@app.get("/v1/events/{stid}/history", response_model=list[EventVersionOut], dependencies=[Depends(require_api_key)])
+def get_history(
+    stid: str,
+    exnum: str = Query(..., min_length=1),
+    limit: int = 20,
+    until: Optional[int] = Query(None, ge=1),
+    diffs: bool = False,
+    db: Session = Depends(get_db),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
+    """
+    Call example:
+      GET /v1/events/student123/history?exnum=EX1
+      GET /v1/events/student123/history?exnum=EX1&diffs=true&limit=50
+
+    Returns up to `limit` versions (ending at version `until`, default latest),
+    oldest first. With diffs=true only the first entry has a full payload and
+    the rest carry JSON patches (RFC 6902) against the entry before them.
+    Reads event_versions, filled when DELTA_HISTORY=1 (see app/history.py).
+    """
+    limit = max(1, min(limit, 200))
+    if router is None:
+        versions = load_history(db, stid, exnum, limit=limit, until=until, diffs=diffs)
+    else:
+        with router.exnum_store(exnum) as store:
+            versions = load_history(store.db, stid, exnum, limit=limit, until=until, diffs=diffs)
+        for version in versions:
+            version["event_id"] = store.public_id(version["event_id"])
+    if not versions:
+        raise HTTPException(status_code=404, detail="Not found")
+    return versions
+
 # ---------------------------------------------------------
 # READ - get event by stid (user ID) and exnum
 # ---------------------------------------------------------
@@ -99,7 +378,8 @@ def list_events(limit: int = 50, offset: int = 0, db: Session = Depends(get_db))
 def get_event_by_id_and_exnum(
     event_id: str,
     exnum: str = Query(..., min_length=1),
-    db: Session = Depends(get_db),
+    store: EventStore = Depends(get_store),
+    router: Optional[ShardRouter] = Depends(get_router),
 ):
     """
     Call example:
@@ -108,22 +388,98 @@ def get_event_by_id_and_exnum(
     Returns the most recent event matching both stid and exnum.
     Returns 404 if no matching event exists.
     """
-    # Query for events where payload.stid matches and payload.exnum matches
-    events = (
-        db.query(Event)
-        .order_by(desc(Event.id))
-        .all()
+    # Indexed lookup on payload.stid / payload.exnum (see app/storage.py)
+    e = store.latest(event_id, exnum) if router is None else router.latest(event_id, exnum)
+    if e is None:
+        # 404 if no matching event found
+        raise HTTPException(status_code=404, detail="Not found")
+
+    return EventsResponse(e)
+
+# ---------------------------------------------------------
+# ADMIN - online backup (gzip-compressed SQLite snapshot)
+# ---------------------------------------------------------
+# every backup writes a full copy to BACKUP_TMPDIR first: one at a time
+backup_running = threading.Lock()
+
+def _stream_backup(path: str):
+    from .backup import iter_gzip
+
+    try:
+        yield b""  # primed in download_backup, see there
+        yield from iter_gzip(path)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+        backup_running.release()
+
+@app.get("/v1/admin/backup", dependencies=[Depends(require_admin_key)])
+def download_backup(
+    method: str = Query("backup", pattern="^(backup|vacuum)$"),
+    shard: Optional[int] = Query(None, ge=0),
+    store: EventStore = Depends(require_sqlite),
+    router: Optional[ShardRouter] = Depends(get_router),
+):
+    """
+    Call example:
+      GET /v1/admin/backup               (online backup API)
+      GET /v1/admin/backup?method=vacuum (VACUUM INTO)
+      GET /v1/admin/backup?shard=2       (SHARD_COUNT > 1: one call per shard)
+
+    Streams a gzip-compressed snapshot of the database; see app/backup.py.
+    With sharding every shard is its own file, so `shard` is required: a
+    snapshot of shard 0 alone would silently miss the other shards' events.
+    Only one backup runs at a time (per worker); another request gets 409
+    until the running one has been streamed out.
+    """
+    from .backup import snapshot_to_tempfile  # only needed here
+
+    if router is not None and (shard is None or shard >= router.count):
+        raise HTTPException(
+            status_code=409,
+            detail=f"SHARD_COUNT={router.count}: back up each shard with ?shard=0..{router.count - 1}",
+        )
+    if not backup_running.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    try:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        if router is None:
+            raw = store.db.connection().connection.driver_connection
+            path = snapshot_to_tempfile(raw, method)
+            filename = f"app-{stamp}.db.gz"
+        else:
+            with router.store(shard) as shard_store:
+                raw = shard_store.db.connection().connection.driver_connection
+                path = snapshot_to_tempfile(raw, method)
+            filename = f"app-{stamp}.shard{shard}.db.gz"
+    except BaseException:
+        backup_running.release()
+        raise
+    body = _stream_backup(path)
+    # a started generator runs its finally when closed or dropped, so the lock
+    # and the file are released even if the response is never sent
+    next(body)
+    return StreamingResponse(
+        body,
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
-    
-    for e in events:
-        p = e.payload or {}
-        if isinstance(p, dict) and p.get("stid") == event_id and p.get("exnum") == exnum:
-            return EventOut(
-                id=e.id,
-                received_at=e.received_at.isoformat(),
-                source=e.source,
-                payload=e.payload,
-            )
-    
-    # 404 if no matching event found
-    raise HTTPException(status_code=404, detail="Not found")
+
+# ---------------------------------------------------------
+# ADMIN - background maintenance stats
+# ---------------------------------------------------------
+@app.get("/v1/admin/maintenance", dependencies=[Depends(require_admin_key)])
+def maintenance_stats():
+    """Last-run stats of the maintenance scheduler (see app/maintenance.py)."""
+    return maintenance.stats()
+
+# ---------------------------------------------------------
+# ADMIN - replication status and replica lag
+# ---------------------------------------------------------
+@app.get("/v1/admin/replication", dependencies=[Depends(require_admin_key)])
+def replication():
+    """
+    On the primary: the latest published snapshot and, per replica, the
+    generation it serves and its lag in seconds. On a replica: its own state.
+    """
+    return replication_status(publisher, follower)
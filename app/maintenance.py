@@ -0,0 +1,173 @@
+# app/maintenance.py
+"""
+Background maintenance for the SQLite file, run from the FastAPI lifespan.
+
+Every MAINTENANCE_INTERVAL_SECONDS the scheduler checks the request rate
+(recorded by RequestRateMiddleware). If the service is idle - at most
+MAINTENANCE_IDLE_RPS requests/s over the last minute - it runs one small slice:
+
+  wal_checkpoint     PASSIVE every slice, TRUNCATE when there was no traffic at all
+  incremental_vacuum at most MAINTENANCE_VACUUM_PAGES free pages per slice
+  optimize           PRAGMA optimize every MAINTENANCE_OPTIMIZE_EVERY slices
+
+MAINTENANCE_INTERVAL_SECONDS=0 disables the scheduler. Stats of the last run of
+each task are served by GET /v1/admin/maintenance.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 60
+DEFAULT_IDLE_RPS = 1.0
+DEFAULT_VACUUM_PAGES = 512
+DEFAULT_OPTIMIZE_EVERY = 60
+
+
+class RequestRate:
+    """Requests per second over a sliding window, kept in one-second buckets."""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._buckets: deque = deque()  # [second, count]
+        self._lock = threading.Lock()
+
+    def hit(self) -> None:
+        now = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == now:
+                self._buckets[-1][1] += 1
+            else:
+                self._buckets.append([now, 1])
+                self._trim(now)
+
+    def _trim(self, now: int) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def per_second(self) -> float:
+        with self._lock:
+            self._trim(int(time.monotonic()))
+            return sum(count for _, count in self._buckets) / self.window
+
+
+class RequestRateMiddleware:
+    """Pure ASGI middleware counting HTTP requests into a RequestRate."""
+
+    def __init__(self, app, rate: RequestRate):
+        self.app = app
+        self.rate = rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.rate.hit()
+        await self.app(scope, receive, send)
+
+
+def _env_number(name: str, default, cast=int):
+    return cast(os.getenv(name, default))
+
+
+class MaintenanceScheduler:
+    def __init__(self, get_engine: Callable[[], Engine], rate: RequestRate):
+        self.get_engine = get_engine
+        self.rate = rate
+        self.interval = _env_number("MAINTENANCE_INTERVAL_SECONDS", DEFAULT_INTERVAL_SECONDS, float)
+        self.idle_rps = _env_number("MAINTENANCE_IDLE_RPS", DEFAULT_IDLE_RPS, float)
+        self.vacuum_pages = _env_number("MAINTENANCE_VACUUM_PAGES", DEFAULT_VACUUM_PAGES)
+        self.optimize_every = _env_number("MAINTENANCE_OPTIMIZE_EVERY", DEFAULT_OPTIMIZE_EVERY)
+        self.slices = 0
+        self.skipped_busy = 0
+        self.tasks: dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def _record(self, name: str, started: float, result: dict) -> None:
+        runs = self.tasks.get(name, {}).get("runs", 0) + 1
+        self.tasks[name] = {
+            "last_run_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "runs": runs,
+            **result,
+        }
+
+    def run_once(self, truncate: bool = False) -> dict:
+        """Run one maintenance slice synchronously and return the task stats."""
+        with self.get_engine().connect() as conn:
+            started = time.perf_counter()
+            mode = "TRUNCATE" if truncate else "PASSIVE"
+            busy, wal_pages, checkpointed = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+            self._record("wal_checkpoint", started, {
+                "mode": mode, "busy": bool(busy), "wal_pages": wal_pages, "checkpointed_pages": checkpointed,
+            })
+
+            started = time.perf_counter()
+            auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            free_before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if auto_vacuum == 2 and free_before:  # 2 = INCREMENTAL
+                # sqlite3's execute() stops after the first step (one page);
+                # executescript() steps the pragma to completion
+                conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages});")
+            free_after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            self._record("incremental_vacuum", started, {
+                "enabled": auto_vacuum == 2, "freed_pages": free_before - free_after, "free_pages": free_after,
+            })
+
+            if self.slices % self.optimize_every == 0:
+                started = time.perf_counter()
+                conn.exec_driver_sql("PRAGMA optimize")
+                self._record("optimize", started, {})
+            conn.commit()
+
+        self.slices += 1
+        return self.tasks
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            rps = self.rate.per_second()
+            if rps > self.idle_rps:
+                self.skipped_busy += 1
+                continue
+            try:
+                await asyncio.to_thread(self.run_once, rps == 0)
+            except Exception as exc:
+                logger.exception("maintenance slice failed")
+                self.tasks["error"] = {"at": datetime.now(timezone.utc).isoformat(), "message": str(exc)}
+
+    def start(self) -> None:
+        # the maintenance PRAGMAs only exist on SQLite
+        if self.enabled and self._task is None and self.get_engine().dialect.name == "sqlite":
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "interval_seconds": self.interval,
+            "idle_rps": self.idle_rps,
+            "request_rate_rps": round(self.rate.per_second(), 3),
+            "slices": self.slices,
+            "skipped_busy": self.skipped_busy,
+            "tasks": self.tasks,
+        }
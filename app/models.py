@@ -1,10 +1,51 @@
-from sqlalchemy import Column, Integer, DateTime, String, JSON, func
+from sqlalchemy import Column, Integer, DateTime, String, JSON, Boolean, ForeignKey, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from .db import Base
 
+# JSONB on PostgreSQL (indexable, see app/storage.py), JSON text elsewhere
+PayloadJSON = JSON().with_variant(JSONB(), "postgresql")
+
 class Event(Base):
     __tablename__ = "events"
 
     id = Column(Integer, primary_key=True, index=True)
     received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     source = Column(String(200), nullable=True)
-    payload = Column(JSON, nullable=False)
+    # JSON null for versions stored as a patch in event_versions (see app/history.py)
+    payload = Column(PayloadJSON, nullable=False)
+
+class EventCell(Base):
+    """One cell of payload.table, stored when TABLE_CELLS is enabled (see app/columnar.py)."""
+    __tablename__ = "event_cells"
+
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    column_name = Column(String(200), primary_key=True)
+    row_index = Column(Integer, primary_key=True)
+    # copied from the payload so per-exercise column reads never touch events.payload
+    exnum = Column(String(200), nullable=True)
+    stid = Column(String(200), nullable=True)
+    value = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        Index("ix_event_cells_exnum_column", "exnum", "column_name", "event_id"),
+    )
+
+class EventVersion(Base):
+    """
+    One submission in a (stid, exnum) chain, stored when DELTA_HISTORY is enabled
+    (see app/history.py). Snapshots keep their payload in events.payload and
+    have a null doc; other versions store only doc, a JSON patch against the
+    previous version, and have a null events.payload.
+    """
+    __tablename__ = "event_versions"
+
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    stid = Column(String(200), nullable=False)
+    exnum = Column(String(200), nullable=False)
+    version = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, nullable=False)
+    doc = Column(JSON, nullable=False)
+
+    __table_args__ = (
+        Index("ix_event_versions_chain", "stid", "exnum", "version", unique=True),
+    )
@@ -0,0 +1,96 @@
+# app/quotas.py
+"""
+Per-source ingestion quotas.
+
+With SOURCE_QUOTA_PER_MINUTE > 0 every `source` gets a token bucket refilled
+at that many events per minute and holding up to SOURCE_QUOTA_BURST events
+(default: one minute's worth). Events beyond it are rejected with 429 and a
+Retry-After header, so one heavy source cannot monopolize the writer. A batch
+is charged as a whole: either all of its events fit or none are taken; one with
+more events of a source than the burst can never fit and gets 413. Tokens are
+taken before the insert (so concurrent requests cannot overshoot) and given
+back when it fails, e.g. with 503 on a busy database.
+
+Buckets live in the process; with several workers each enforces its own share.
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+
+MAX_TRACKED_SOURCES = 10000
+
+
+def quota_per_minute() -> float:
+    return float(os.getenv("SOURCE_QUOTA_PER_MINUTE", "0"))
+
+
+def _burst(per_minute: float) -> float:
+    return float(os.getenv("SOURCE_QUOTA_BURST") or per_minute)
+
+
+class SourceQuotas:
+    def __init__(self):
+        self._buckets: dict = {}  # source -> [tokens, last refill (monotonic)]
+        self._lock = threading.Lock()
+
+    def charge(self, sources: Iterable[Optional[str]]) -> None:
+        """Take one token per event from each source's bucket, or raise 429."""
+        per_minute = quota_per_minute()
+        if per_minute <= 0:
+            return
+        rate = per_minute / 60.0
+        burst = _burst(per_minute)
+        wanted = Counter(source or "" for source in sources)
+        for source, n in wanted.items():
+            if n > burst:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{n} events of source {source or None!r} exceed its ingestion burst of {burst:g}",
+                )
+        now = time.monotonic()
+
+        with self._lock:
+            if len(self._buckets) > MAX_TRACKED_SOURCES:
+                # full buckets carry no state worth keeping
+                self._buckets = {s: b for s, b in self._buckets.items() if b[0] + (now - b[1]) * rate < burst}
+            buckets = {}
+            for source, n in wanted.items():
+                tokens, last = self._buckets.get(source, (burst, now))
+                tokens = min(burst, tokens + (now - last) * rate)
+                if n > tokens:
+                    raise HTTPException(
+                        status_code=429,
+                        detail=f"Ingestion quota exceeded for source {source or None!r}",
+                        headers={"Retry-After": str(math.ceil((n - tokens) / rate))},
+                    )
+                buckets[source] = [tokens - n, now]
+            self._buckets.update(buckets)
+
+    def refund(self, sources: Iterable[Optional[str]]) -> None:
+        """Give back the tokens of events that were charged but not stored."""
+        per_minute = quota_per_minute()
+        if per_minute <= 0:
+            return
+        burst = _burst(per_minute)
+        with self._lock:
+            for source, n in Counter(source or "" for source in sources).items():
+                bucket = self._buckets.get(source)
+                if bucket is not None:
+                    bucket[0] = min(burst, bucket[0] + n)
+
+    @contextmanager
+    def charged(self, sources: Iterable[Optional[str]]) -> Iterator[None]:
+        """charge() for the events stored in the block; refunded if it raises."""
+        sources = list(sources)
+        self.charge(sources)
+        try:
+            yield
+        except BaseException:
+            self.refund(sources)
+            raise
@@ -0,0 +1,309 @@
+# app/replication.py
+"""
+Read replicas fed by periodic snapshots over a shared directory.
+
+REPLICATION_ROLE=primary
+    Every SNAPSHOT_INTERVAL_SECONDS, if new events arrived, the writer takes a
+    paged online backup (app/backup.py) into SNAPSHOT_DIR and atomically
+    replaces SNAPSHOT_DIR/manifest.json:
+        {"generation": 7, "file": "snapshot-7.db", "created_at": ..., "last_event_id": ...}
+
+REPLICATION_ROLE=replica
+    Every REPLICA_POLL_SECONDS the replica reads the manifest, copies a newer
+    snapshot into REPLICA_DIR and switches its engine to the copy (read-only).
+    Writes are refused with 503, and so is everything under /v1/ until the
+    first snapshot has arrived. It reports its state to
+    SNAPSHOT_DIR/replicas/<REPLICA_ID>.json so the primary can show the lag of
+    every replica, and adds an X-Replication-Lag header to its responses.
+
+Lag is the age of the snapshot a replica serves: now - snapshot created_at.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Engine
+
+from . import db as db_module
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+REPLICA = "replica"
+MANIFEST = "manifest.json"
+KEEP_SNAPSHOTS = 2  # a replica may still be copying the previous one
+
+DEFAULT_SNAPSHOT_DIR = "/snapshots"
+DEFAULT_REPLICA_DIR = "/data/replica"
+DEFAULT_SNAPSHOT_INTERVAL_SECONDS = 30
+DEFAULT_POLL_SECONDS = 5
+
+
+def replication_role() -> str:
+    return os.getenv("REPLICATION_ROLE", "").lower()
+
+
+def require_primary() -> None:
+    """FastAPI dependency for write endpoints."""
+    if replication_role() == REPLICA:
+        raise HTTPException(status_code=503, detail="Read-only replica; send writes to the primary")
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _lag_seconds(created_at: Optional[float]) -> Optional[float]:
+    return None if created_at is None else round(time.time() - created_at, 3)
+
+
+class _Periodic:
+    """Runs self.tick() in a worker thread every `interval` seconds."""
+
+    interval: float = 0
+    _task: Optional[asyncio.Task] = None
+    last_error: Optional[str] = None
+
+    def tick(self):
+        raise NotImplementedError
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.tick)
+                self.last_error = None
+            except Exception as exc:
+                logger.exception("%s failed", type(self).__name__)
+                self.last_error = str(exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class SnapshotPublisher(_Periodic):
+    def __init__(self, get_engine: Callable[[], Engine], directory: Optional[str] = None):
+        self.get_engine = get_engine
+        self.directory = directory or os.getenv("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+        self.interval = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", DEFAULT_SNAPSHOT_INTERVAL_SECONDS))
+        self.manifest: Optional[dict] = None
+
+    def start(self) -> None:
+        # snapshots are taken with the SQLite backup API
+        if self.get_engine().dialect.name == "sqlite":
+            super().start()
+
+    def tick(self) -> Optional[dict]:
+        """Publish a new snapshot if events changed since the last one."""
+        from .backup import snapshot  # keeps app import light (see test_import_time.py)
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self.manifest is None:
+            self.manifest = _read_json(os.path.join(self.directory, MANIFEST))
+
+        raw = self.get_engine().raw_connection()
+        try:
+            source = raw.driver_connection
+            last_event_id = source.execute("SELECT coalesce(max(id), 0) FROM events").fetchone()[0]
+            if self.manifest and self.manifest["last_event_id"] == last_event_id:
+                return None
+            generation = (self.manifest["generation"] if self.manifest else 0) + 1
+            name = f"snapshot-{generation}.db"
+            tmp = os.path.join(self.directory, f".{name}.tmp")
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            created_at = time.time()
+            snapshot(source, tmp)
+        finally:
+            raw.close()
+
+        # rollback journal, so replicas can open the copy read-only without -wal/-shm files
+        copy = sqlite3.connect(tmp)
+        copy.execute("PRAGMA journal_mode = DELETE")
+        copy.close()
+        os.replace(tmp, os.path.join(self.directory, name))
+
+        self.manifest = {
+            "generation": generation,
+            "file": name,
+            "created_at": created_at,
+            "last_event_id": last_event_id,
+        }
+        _write_json(os.path.join(self.directory, MANIFEST), self.manifest)
+        for old in range(generation - KEEP_SNAPSHOTS, 0, -1):
+            path = os.path.join(self.directory, f"snapshot-{old}.db")
+            if not os.path.exists(path):
+                break
+            os.unlink(path)
+        return self.manifest
+
+    def status(self) -> dict:
+        replicas = []
+        replicas_dir = os.path.join(self.directory, "replicas")
+        if os.path.isdir(replicas_dir):
+            for name in sorted(os.listdir(replicas_dir)):
+                state = _read_json(os.path.join(replicas_dir, name)) if name.endswith(".json") else None
+                if state:
+                    state["lag_seconds"] = _lag_seconds(state.get("snapshot_created_at"))
+                    if self.manifest:
+                        state["generations_behind"] = self.manifest["generation"] - (state.get("generation") or 0)
+                    replicas.append(state)
+        return {
+            "role": PRIMARY,
+            "snapshot_dir": self.directory,
+            "interval_seconds": self.interval,
+            "manifest": self.manifest,
+            "last_error": self.last_error,
+            "replicas": replicas,
+        }
+
+
+class SnapshotFollower(_Periodic):
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        local_dir: Optional[str] = None,
+        switch: Callable[..., None] = None,
+    ):
+        self.directory = directory or os.getenv("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+        self.local_dir = local_dir or os.getenv("REPLICA_DIR", DEFAULT_REPLICA_DIR)
+        self.interval = float(os.getenv("REPLICA_POLL_SECONDS", DEFAULT_POLL_SECONDS))
+        self.replica_id = os.getenv("REPLICA_ID") or socket.gethostname()
+        self.switch = switch or db_module.use_database
+        self.applied: Optional[dict] = None
+        self.applied_at: Optional[float] = None
+        self.primary_generation: Optional[int] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.applied is not None
+
+    def lag_seconds(self) -> Optional[float]:
+        return _lag_seconds(self.applied["created_at"] if self.applied else None)
+
+    def tick(self) -> bool:
+        """Switch to the newest published snapshot. Returns True if it switched."""
+        manifest = _read_json(os.path.join(self.directory, MANIFEST))
+        switched = False
+        if manifest:
+            self.primary_generation = manifest["generation"]
+            if not self.applied or manifest["generation"] > self.applied["generation"]:
+                self._apply(manifest)
+                switched = True
+        self._report()
+        return switched
+
+    def _apply(self, manifest: dict) -> None:
+        os.makedirs(self.local_dir, exist_ok=True)
+        local = os.path.join(self.local_dir, f"replica-{manifest['generation']}.db")
+        shutil.copyfile(os.path.join(self.directory, manifest["file"]), f"{local}.tmp")
+        os.replace(f"{local}.tmp", local)
+        self.switch(f"sqlite:///file:{local}?mode=ro&uri=true", read_only=True)
+
+        previous = self.applied
+        self.applied, self.applied_at = manifest, time.time()
+        if previous:
+            # open connections keep the unlinked file alive until they close
+            stale = os.path.join(self.local_dir, f"replica-{previous['generation']}.db")
+            if os.path.exists(stale):
+                os.unlink(stale)
+
+    def _report(self) -> None:
+        state = {
+            "replica_id": self.replica_id,
+            "generation": self.applied["generation"] if self.applied else None,
+            "last_event_id": self.applied["last_event_id"] if self.applied else None,
+            "snapshot_created_at": self.applied["created_at"] if self.applied else None,
+            "applied_at": self.applied_at,
+            "reported_at": time.time(),
+        }
+        replicas_dir = os.path.join(self.directory, "replicas")
+        try:
+            os.makedirs(replicas_dir, exist_ok=True)
+            _write_json(os.path.join(replicas_dir, f"{self.replica_id}.json"), state)
+        except OSError as exc:
+            # the replica keeps serving, but the primary cannot show its lag
+            logger.warning("cannot write replica status to %s: %s", replicas_dir, exc)
+
+    def status(self) -> dict:
+        return {
+            "role": REPLICA,
+            "replica_id": self.replica_id,
+            "ready": self.ready,
+            "generation": self.applied["generation"] if self.applied else None,
+            "primary_generation": self.primary_generation,
+            "last_event_id": self.applied["last_event_id"] if self.applied else None,
+            "snapshot_created_at": self.applied["created_at"] if self.applied else None,
+            "lag_seconds": self.lag_seconds(),
+            "last_error": self.last_error,
+        }
+
+
+class ReplicationLagMiddleware:
+    """
+    On a replica: adds X-Replication-Lag (seconds) to every response, and
+    answers /v1/ requests with 503 until the first snapshot has been applied
+    (nginx then retries them on the primary).
+    """
+
+    def __init__(self, app, follower: SnapshotFollower):
+        self.app = app
+        self.follower = follower
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replication_role() != REPLICA:
+            await self.app(scope, receive, send)
+            return
+        if not self.follower.ready and scope["path"].startswith("/v1/"):
+            response = JSONResponse(
+                {"detail": "Replica has no snapshot yet"}, status_code=503, headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_lag(message):
+            if message["type"] == "http.response.start":
+                lag = self.follower.lag_seconds()
+                header = b"unknown" if lag is None else str(lag).encode()
+                message["headers"] = [*message.get("headers", []), (b"x-replication-lag", header)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_lag)
+
+
+def replication_status(publisher: SnapshotPublisher, follower: SnapshotFollower) -> dict:
+    role = replication_role()
+    if role == PRIMARY:
+        return publisher.status()
+    if role == REPLICA:
+        return follower.status()
+    return {"role": None}
@@ -0,0 +1,64 @@
+# app/rows.py
+"""
+Lightweight event rows for the hot read paths (list and lookup).
+
+EventStore.recent() and .latest() run a Core select of the four columns
+instead of loading ORM Event instances, so no identity map, instance state or
+attribute instrumentation is set up per row. The payload is selected as its
+stored JSON text (CAST(payload AS TEXT)) and written into the response as-is:
+it is never decoded into dicts nor re-encoded, and the rows skip the EventOut
+validation round trip. bench/bench_rows.py measures the difference.
+"""
+import json
+
+from fastapi.responses import Response
+from sqlalchemy import Text, cast
+
+from .models import Event
+
+events = Event.__table__
+
+# SELECT id, received_at, source, CAST(payload AS TEXT)
+EVENT_COLUMNS = (
+    events.c.id,
+    events.c.received_at,
+    events.c.source,
+    cast(events.c.payload, Text).label("payload_json"),
+)
+
+
+class EventRow:
+    __slots__ = ("id", "received_at", "source", "payload_json")
+
+    def __init__(self, id, received_at, source, payload_json):
+        self.id = id
+        self.received_at = received_at
+        self.source = source
+        self.payload_json = payload_json
+
+    @property
+    def payload(self) -> dict:
+        """Decoded payload; the endpoints use payload_json directly."""
+        return json.loads(self.payload_json)
+
+    def to_json(self) -> str:
+        """The EventOut JSON object for this row."""
+        return '{"id":%d,"received_at":%s,"source":%s,"payload":%s}' % (
+            self.id,
+            json.dumps(self.received_at.isoformat()),
+            json.dumps(self.source),
+            self.payload_json,
+        )
+
+
+class EventsResponse(Response):
+    """JSON response assembled from EventRows without an encode pass."""
+
+    media_type = "application/json"
+
+    def __init__(self, rows, status_code: int = 200, headers=None):
+        if isinstance(rows, EventRow):
+            body = rows.to_json()
+        else:
+            body = "[" + ",".join(row.to_json() for row in rows) + "]"
+        super().__init__(body.encode(), status_code=status_code, headers=headers)
@@ -1,12 +1,34 @@
 from pydantic import BaseModel, Field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 class EventIn(BaseModel):
     source: Optional[str] = Field(default=None, max_length=200)
     payload: Dict[str, Any]
 
+class EventBatchIn(BaseModel):
+    events: List[EventIn] = Field(..., min_length=1)
+
+class EventBatchOut(BaseModel):
+    inserted: int
+
 class EventOut(BaseModel):
     id: int
     received_at: str
     source: Optional[str]
     payload: Dict[str, Any]
+
+class EventSearchHit(EventOut):
+    snippet: str
+    rank: float
+
+class EventColumns(BaseModel):
+    id: int
+    stid: Optional[str]
+    columns: Dict[str, List[Any]]
+
+class EventVersionOut(BaseModel):
+    event_id: int
+    version: int
+    received_at: str
+    payload: Optional[Dict[str, Any]] = None
+    patch: Optional[List[Dict[str, Any]]] = None
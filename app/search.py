@@ -0,0 +1,108 @@
+# app/search.py
+"""
+Full-text search over event payloads with SQLite FTS5.
+
+`events_fts` indexes stid, exnum, source and the JSON text of payload.table for
+every event. Triggers on `events` keep it in sync, so every write path (the API,
+app.bulk_import, manual SQL) is covered. The schema is installed from the
+metadata after_create hook, which also backfills rows that predate the index.
+
+An event stored as a delta (DELTA_HISTORY, see app/history.py) is indexed from
+its full payload on INSERT; the update trigger skips the later replacement of
+its payload by JSON null, and search_events() rebuilds the payloads of hits.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import Float, String, event, text
+from sqlalchemy.orm import Session
+
+from .db import Base
+from .history import rebuild_payloads
+from .models import Event
+
+FTS_TABLE = "events_fts"
+
+_FIELDS = (
+    "json_extract({row}.payload, '$.stid'), "
+    "json_extract({row}.payload, '$.exnum'), "
+    "{row}.source, "
+    "json_extract({row}.payload, '$.table')"
+)
+
+SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(stid, exnum, source, body, tokenize = 'unicode61')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON events BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, stid, exnum, source, body)
+        VALUES (new.id, {_FIELDS.format(row="new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON events BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    # recreated so databases created before the WHEN clause get it too
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF source, payload ON events
+    WHEN json_type(new.payload) IS NOT 'null' BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, stid, exnum, source, body)
+        VALUES (new.id, {_FIELDS.format(row="new")});
+    END
+    """,
+]
+
+# Events inserted before the index existed (ids are monotonic, so only the tail)
+BACKFILL = f"""
+INSERT INTO {FTS_TABLE} (rowid, stid, exnum, source, body)
+SELECT e.id, {_FIELDS.format(row="e")} FROM events AS e
+WHERE e.id > (SELECT coalesce(max(rowid), 0) FROM {FTS_TABLE})
+"""
+
+SEARCH = text(f"""
+SELECT e.id, e.received_at, e.source, e.payload,
+       snippet({FTS_TABLE}, -1, '[', ']', '...', :tokens) AS snippet,
+       bm25({FTS_TABLE}) AS rank
+FROM {FTS_TABLE} JOIN events AS e ON e.id = {FTS_TABLE}.rowid
+WHERE {FTS_TABLE} MATCH :q
+ORDER BY rank
+LIMIT :limit OFFSET :offset
+""").columns(
+    Event.__table__.c.id, Event.__table__.c.received_at, Event.__table__.c.source, Event.__table__.c.payload,
+    snippet=String, rank=Float,
+)
+
+
+class SearchHit(NamedTuple):
+    id: int
+    received_at: datetime
+    source: Optional[str]
+    payload: dict
+    snippet: str
+    rank: float
+
+
+@event.listens_for(Base.metadata, "after_create")
+def install_search_index(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in SCHEMA:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(BACKFILL)
+
+
+def search_events(db: Session, q: str, limit: int, offset: int = 0, snippet_tokens: int = 12):
+    """Best matches first (bm25); raises sqlalchemy OperationalError on bad FTS5 syntax."""
+    params = {"q": q, "limit": limit, "offset": offset, "tokens": snippet_tokens}
+    rows = db.execute(SEARCH, params).all()
+    rebuilt = rebuild_payloads(db, [row.id for row in rows if row.payload is None])
+    return [
+        SearchHit(row.id, row.received_at, row.source, rebuilt.get(row.id, row.payload), row.snippet, row.rank)
+        for row in rows
+    ]
@@ -10,3 +10,13 @@ def require_api_key(api_key: str = Security(api_key_header)) -> str:
     if not api_key or api_key != expected:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
     return api_key
+
+def require_admin_key(api_key: str = Security(api_key_header)) -> str:
+    # /v1/admin/* can copy the whole database: it takes its own key, not the
+    # ingest key shared with every client. Unset (or equal to API_KEY): off.
+    expected = os.getenv("ADMIN_API_KEY", "")
+    if not expected or expected == os.getenv("API_KEY", "CaJx3nOo9sKZfW7Rl5c4T"):
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_API_KEY")
+    if not api_key or api_key != expected:
+        raise HTTPException(status_code=401, detail="Invalid or missing admin API key")
+    return api_key
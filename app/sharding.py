@@ -0,0 +1,132 @@
+# app/sharding.py
+"""
+Optional sharding of events across SQLite files.
+
+SHARD_COUNT=N (default 1: off) spreads events over N database files, each with
+its own engine and so its own writer lock; writes to different shards no
+longer wait for each other. Shard 0 is DATABASE_URL, shard i the same path
+with ".shard<i>" before the extension (/data/app.db -> /data/app.shard1.db).
+SHARD_KEY picks what is hashed (crc32) to a shard: "source" (default) keeps a
+heavy source on one shard, "exnum" keeps every exercise on one shard.
+
+Event ids are local_id * N + shard (EventStore.public_id), unique across shards.
+
+  POST /v1/events             the shard of the event's key
+  POST /v1/events/batch       events grouped by shard, one transaction per shard
+  GET  /v1/events             every shard's newest page, merged newest first
+  GET  /v1/events/{stid}      SHARD_KEY=exnum: one shard; source: all, newest wins
+  GET  /v1/events/search      all shards, merged by rank
+  columns and history         SHARD_KEY=exnum: one shard; source: 501
+
+Changing SHARD_COUNT or SHARD_KEY moves keys to other shards, so set them
+before the first event is stored. Backups copy one shard at a time (?shard= on
+the endpoint, --shard in app/backup.py), and replication is refused: a primary
+does not start with SHARD_COUNT > 1, and a replica with it serves no reads
+(503), so nginx sends them to the primary.
+"""
+import heapq
+import os
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.engine import Engine, make_url
+
+from . import db as db_module
+from .rows import EventRow
+from .storage import EventStore, store_for
+
+SHARD_KEYS = ("source", "exnum")
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def shard_count() -> int:
+    return max(1, int(os.getenv("SHARD_COUNT", "1")))
+
+
+def shard_url(url: str, index: int) -> str:
+    """DATABASE_URL of shard `index`; shard 0 is the URL itself."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        raise ValueError("SHARD_COUNT > 1 needs a file-backed SQLite DATABASE_URL")
+    if index == 0:
+        return url
+    root, ext = os.path.splitext(parsed.database)
+    return parsed.set(database=f"{root}.shard{index}{ext}").render_as_string(hide_password=False)
+
+
+def _newest_first(row: EventRow):
+    return (row.received_at, row.id)
+
+
+class ShardRouter:
+    def __init__(self, engines: list[Engine], key: str = "source"):
+        if key not in SHARD_KEYS:
+            raise ValueError(f"SHARD_KEY must be one of {SHARD_KEYS}, not {key!r}")
+        self.engines = engines
+        self.key = key
+        self.count = len(engines)
+
+    def shard_of(self, value) -> int:
+        return zlib.crc32(("" if value is None else str(value)).encode()) % self.count
+
+    def shard_for_event(self, source: Optional[str], payload: dict) -> int:
+        return self.shard_of(source if self.key == "source" else payload.get("exnum"))
+
+    @contextmanager
+    def store(self, index: int) -> Iterator[EventStore]:
+        db = db_module.SessionLocal(bind=self.engines[index])
+        try:
+            yield store_for(db, index, self.count)
+        finally:
+            db.close()
+
+    @contextmanager
+    def stores(self, indexes: Optional[Iterable[int]] = None) -> Iterator[list[EventStore]]:
+        """Stores of the given shards (default: all), each on its own session."""
+        with ExitStack() as stack:
+            yield [stack.enter_context(self.store(i)) for i in (range(self.count) if indexes is None else indexes)]
+
+    @contextmanager
+    def exnum_store(self, exnum: str) -> Iterator[EventStore]:
+        """The store holding every event of `exnum`; 501 unless SHARD_KEY=exnum."""
+        if self.key != "exnum":
+            raise HTTPException(status_code=501, detail="Not available with SHARD_KEY=source")
+        with self.store(self.shard_of(exnum)) as store:
+            yield store
+
+    def recent(self, limit: int, offset: int) -> list[EventRow]:
+        """Newest events first across all shards (received_at, then id)."""
+        with self.stores() as stores:
+            # each page is already newest first; the merge only interleaves them
+            pages = [store.recent(limit + offset, 0) for store in stores]
+        merged = heapq.merge(*pages, key=_newest_first, reverse=True)
+        return list(islice(merged, offset, offset + limit))
+
+    def latest(self, stid: str, exnum: str) -> Optional[EventRow]:
+        if self.key == "exnum":
+            with self.exnum_store(exnum) as store:
+                return store.latest(stid, exnum)
+        with self.stores() as stores:
+            found = [row for row in (store.latest(stid, exnum) for store in stores) if row is not None]
+        return max(found, key=_newest_first, default=None)
+
+
+def get_router() -> Optional[ShardRouter]:
+    """The application's router, or None when sharding is off (SHARD_COUNT <= 1)."""
+    global _router
+    count = shard_count()
+    if count <= 1:
+        return None
+    if _router is None or _router.count != count:
+        with _router_lock:
+            if _router is None or _router.count != count:
+                urls = [shard_url(db_module.DATABASE_URL, i) for i in range(count)]
+                engines = [db_module.get_engine()] + [db_module.make_engine(url) for url in urls[1:]]
+                _router = ShardRouter(engines, os.getenv("SHARD_KEY", "source").lower())
+    return _router
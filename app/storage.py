@@ -0,0 +1,193 @@
+# app/storage.py
+"""
+Storage backends behind the event endpoints.
+
+The endpoints talk to an EventStore bound to the request's session; the
+implementation is picked from the session's dialect (i.e. from DATABASE_URL):
+
+  sqlite:///...                 SQLiteEventStore
+  postgresql+psycopg://...      PostgresEventStore (payload is JSONB)
+
+Both back the (stid, exnum) lookup with an expression index instead of scanning
+payloads in Python. PostgreSQL additionally gets a GIN index on payload for
+containment queries, and add_many() uses COPY for batch ingest.
+
+With DELTA_HISTORY, most resubmissions are stored as patches and their
+events.payload is JSON null (see app/history.py): recent() and latest() rebuild
+those payloads, and latest() also checks the chain's newest version, which the
+payload index cannot see.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, desc, event, func, insert, literal_column, select
+from sqlalchemy.orm import Session
+
+from .db import Base
+from .history import chain_head, rebuild_payloads
+from .models import Event
+from .rows import EVENT_COLUMNS, EventRow
+
+INDEXES = {
+    "sqlite": [
+        "CREATE INDEX IF NOT EXISTS ix_events_stid_exnum ON events "
+        "(json_extract(payload, '$.stid'), json_extract(payload, '$.exnum'), id)",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_events_stid_exnum ON events "
+        "((payload ->> 'stid'), (payload ->> 'exnum'), id)",
+        "CREATE INDEX IF NOT EXISTS ix_events_payload_gin ON events USING gin (payload jsonb_path_ops)",
+    ],
+}
+
+
+@event.listens_for(Base.metadata, "after_create")
+def install_indexes(target, connection, **kw):
+    for statement in INDEXES.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+
+# dialect -> the statement behind EventStore.latest()
+_LATEST_QUERIES = {}
+
+
+class EventStore:
+    """Backend-neutral operations; subclasses override the dialect-specific parts."""
+
+    dialect = None
+    # SQLite-only features (FTS5 search, online backup, PRAGMA maintenance)
+    sqlite_features = False
+
+    def __init__(self, db: Session, shard_index: int = 0, shard_count: int = 1):
+        self.db = db
+        # see app/sharding.py; a single database is shard 0 of 1
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+    def public_id(self, local_id: int) -> int:
+        """Event id as exposed by the API, unique across shards."""
+        return local_id * self.shard_count + self.shard_index
+
+    def _event_rows(self, rows) -> list[EventRow]:
+        out = []
+        deltas = {}
+        for event_id, received_at, source, payload_json in rows:
+            row = EventRow(self.public_id(event_id), received_at, source, payload_json)
+            if payload_json == "null":
+                deltas[event_id] = row
+            out.append(row)
+        if deltas:
+            for event_id, payload in rebuild_payloads(self.db, deltas).items():
+                deltas[event_id].payload_json = json.dumps(payload)
+        return out
+
+    def _received_at(self) -> dict:
+        # The server default (CURRENT_TIMESTAMP on SQLite) has one-second
+        # resolution; cross-shard merges order by received_at, so shards
+        # stamp events themselves, in microseconds.
+        if self.shard_count == 1:
+            return {}
+        return {"received_at": datetime.now(timezone.utc).replace(tzinfo=None)}
+
+    def add(self, source: Optional[str], payload: dict) -> Event:
+        """Insert one event in the current transaction; its id is assigned on return."""
+        e = Event(source=source, payload=payload, **self._received_at())
+        self.db.add(e)
+        self.db.flush()
+        return e
+
+    def add_many(self, events: Iterable[tuple[Optional[str], dict]]) -> int:
+        """Insert many events in the current transaction. Returns the count."""
+        rows = [{"source": source, "payload": payload, **self._received_at()} for source, payload in events]
+        if rows:
+            self.db.execute(insert(Event), rows)
+        return len(rows)
+
+    def _rows(self, stmt, params=None):
+        # Core statement on the session's connection: plain rows, no ORM loading
+        return self.db.connection().execute(stmt, params)
+
+    def recent(self, limit: int, offset: int) -> list[EventRow]:
+        """Newest events first."""
+        return self._event_rows(self._rows(select(*EVENT_COLUMNS).order_by(desc(Event.id)).offset(offset).limit(limit)))
+
+    def _stid_exnum(self, stid, exnum):
+        raise NotImplementedError
+
+    def _latest_query(self):
+        # Built once per dialect: constructing a statement and its cache key
+        # costs more than running the indexed lookup itself.
+        query = _LATEST_QUERIES.get(self.dialect)
+        if query is None:
+            stid, exnum = bindparam("stid"), bindparam("exnum")
+            newest = select(Event.id).where(*self._stid_exnum(stid, exnum)).order_by(desc(Event.id)).limit(1)
+            # a newer version stored as a delta has a null payload, which the
+            # index cannot find; the chain's head in event_versions covers it
+            query = _LATEST_QUERIES[self.dialect] = (
+                select(*EVENT_COLUMNS)
+                .where(Event.id.in_([newest.scalar_subquery(), chain_head(stid, exnum)]))
+                .order_by(desc(Event.id))
+                .limit(1)
+            )
+        return query
+
+    def latest(self, stid: str, exnum: str) -> Optional[EventRow]:
+        """Most recent event whose payload has this stid and exnum."""
+        row = self._rows(self._latest_query(), {"stid": stid, "exnum": exnum}).first()
+        return None if row is None else self._event_rows([row])[0]
+
+
+class SQLiteEventStore(EventStore):
+    dialect = "sqlite"
+    sqlite_features = True
+
+    def _stid_exnum(self, stid, exnum):
+        # same expressions as ix_events_stid_exnum, so the planner uses it;
+        # the JSON paths must be literals, a bound path never matches the index
+        return (
+            func.json_extract(Event.payload, literal_column("'$.stid'")) == stid,
+            func.json_extract(Event.payload, literal_column("'$.exnum'")) == exnum,
+        )
+
+
+class PostgresEventStore(EventStore):
+    dialect = "postgresql"
+
+    def _stid_exnum(self, stid, exnum):
+        # literal keys (not bind parameters) so the expressions match the index
+        return (
+            literal_column("events.payload ->> 'stid'") == stid,
+            literal_column("events.payload ->> 'exnum'") == exnum,
+        )
+
+    def recent(self, limit, offset):
+        # PostgreSQL computes the select list for every row skipped by OFFSET,
+        # and CAST(payload AS TEXT) serializes each JSONB document: page over
+        # ids first, then read the page's rows
+        page = select(Event.id).order_by(desc(Event.id)).offset(offset).limit(limit).subquery()
+        return self._event_rows(
+            self._rows(select(*EVENT_COLUMNS).join(page, page.c.id == Event.id).order_by(desc(Event.id)))
+        )
+
+    def add_many(self, events):
+        """COPY the events in; much faster than INSERTs for large batches."""
+        raw = self.db.connection().connection.driver_connection  # psycopg.Connection
+        count = 0
+        with raw.cursor() as cursor:
+            with cursor.copy("COPY events (source, payload) FROM STDIN") as copy:
+                for source, payload in events:
+                    copy.write_row((source, json.dumps(payload)))
+                    count += 1
+        return count
+
+
+STORES = {store.dialect: store for store in (SQLiteEventStore, PostgresEventStore)}
+
+
+def store_for(db: Session, shard_index: int = 0, shard_count: int = 1) -> EventStore:
+    dialect = db.get_bind().dialect.name
+    try:
+        return STORES[dialect](db, shard_index, shard_count)
+    except KeyError:
+        raise RuntimeError(f"unsupported database dialect {dialect!r}")
@@ -0,0 +1,107 @@
+"""
+Read-path benchmark: ORM Event + EventOut vs. slim rows (app/rows.py).
+
+    python bench/bench_rows.py
+    python bench/bench_rows.py --events 20000 --pages 500 --page-size 200
+
+For 200-row pages of GET /v1/events it times the old path (session query of
+Event instances, EventOut per row, JSON encoding of the models) against the
+current one (Core select into EventRow, payload text written as-is), and
+reports the peak memory allocated per row (tracemalloc).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, desc
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.models import Event
+from app.rows import EventsResponse
+from app.schemas import EventOut
+from app.storage import store_for
+
+
+def _payload(i: int) -> dict:
+    return {
+        "stid": f"st-{i % 500}",
+        "exnum": f"EX{i % 20}",
+        "table": {f"test{j}": (i + j) % 3 != 0 for j in range(12)},
+    }
+
+
+def orm_page(db, limit, offset) -> bytes:
+    rows = db.query(Event).order_by(desc(Event.id)).offset(offset).limit(limit).all()
+    out = [
+        EventOut(id=e.id, received_at=e.received_at.isoformat(), source=e.source, payload=e.payload)
+        for e in rows
+    ]
+    db.expunge_all()  # a request-scoped session would be discarded too
+    return json.dumps(jsonable_encoder(out)).encode()
+
+
+def slim_page(db, limit, offset) -> bytes:
+    return EventsResponse(store_for(db).recent(limit, offset)).body
+
+
+def _measure(fn, db, pages, page_size, total):
+    offsets = [(i * page_size) % max(1, total - page_size) for i in range(pages)]
+    fn(db, page_size, 0)  # warm up statement caches
+    start = time.perf_counter()
+    for offset in offsets:
+        fn(db, page_size, offset)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn(db, page_size, offsets[-1])
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return elapsed / pages, peak / page_size
+
+
+def run(events: int, pages: int, page_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'rows.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+        with Session() as db:
+            store_for(db).add_many(("bench", _payload(i)) for i in range(events))
+            db.commit()
+
+            print(f"{events} events, {pages} pages of {page_size}")
+            results = {}
+            for name, fn in (("orm", orm_page), ("slim", slim_page)):
+                per_page, peak_per_row = _measure(fn, db, pages, page_size, events)
+                db.rollback()
+                results[name] = per_page
+                print(
+                    f"{name:<5} {per_page * 1000:8.3f} ms/page   {per_page / page_size * 1e6:7.2f} us/row   "
+                    f"peak {peak_per_row / 1024:6.2f} KiB/row"
+                )
+            print(f"speed-up {results['orm'] / results['slim']:.1f}x")
+        engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args(argv)
+    run(args.events, args.pages, args.page_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
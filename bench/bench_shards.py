@@ -0,0 +1,78 @@
+"""
+Write-throughput benchmark for sharding (app/sharding.py).
+
+    python bench/bench_shards.py
+    python bench/bench_shards.py --shards 1 2 4 8 --writers 8 --events 4000
+
+For each shard count, `--writers` threads insert single-event transactions
+(as POST /v1/events does) from `--sources` sources into temp-file SQLite
+shards, and the events/s are reported. A single shard serializes every writer
+on one lock; more shards let writers of different sources commit in parallel.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.exc import OperationalError
+
+from app.db import Base, make_engine
+from app.sharding import ShardRouter
+
+
+def _payload(i: int) -> dict:
+    return {"stid": f"st-{i % 500}", "exnum": f"EX{i % 20}", "table": {f"test{j}": j % 3 != 0 for j in range(12)}}
+
+
+def run(shards: int, writers: int, events: int, sources: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [make_engine(f"sqlite:///{os.path.join(tmp, f'shard{i}.db')}") for i in range(shards)]
+        for engine in engines:
+            Base.metadata.create_all(bind=engine)
+        router = ShardRouter(engines, "source")
+
+        def writer(w):
+            for i in range(w, events, writers):
+                source = f"src-{i % sources}"
+                with router.store(router.shard_for_event(source, {})) as store:
+                    while True:
+                        try:
+                            store.add(source, _payload(i))
+                            store.db.commit()
+                            break
+                        except OperationalError:  # database is locked: retry, as a client would
+                            store.db.rollback()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(writers) as pool:
+            list(pool.map(writer, range(writers)))
+        elapsed = time.perf_counter() - start
+        for engine in engines:
+            engine.dispose()
+    return events / elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--sources", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    print(f"{args.writers} writers, {args.events} single-event transactions, {args.sources} sources")
+    baseline = None
+    for shards in args.shards:
+        rate = run(shards, args.writers, args.events, args.sources)
+        baseline = baseline or rate
+        print(f"{shards:>3} shards {rate:>10,.0f} events/s   x{rate / baseline:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,19 +6,20 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-# Prevent main.py from creating tables on import
-import sys
-from unittest import mock
+# The app engine is only used by the lifespan (create_all) and background
+# maintenance; keep both away from /data during tests. Requests go to the
+# test_db_session below through the get_db override.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("MAINTENANCE_INTERVAL_SECONDS", "0")
 
-# Mock the database creation before importing app
-with mock.patch('app.db.Base.metadata.create_all'):
-    from app.main import app, get_db
-    from app.db import Base
+from app.main import app, get_db
+from app.db import Base
 
 
 # Test database (in-memory SQLite)
 TEST_DATABASE_URL = "sqlite:///:memory:"
 TEST_API_KEY = "test-api-key-12345"
+TEST_ADMIN_API_KEY = "test-admin-key-67890"
 
 
 @pytest.fixture(scope="function")
@@ -59,8 +60,9 @@ def client(test_db_session):
 
     app.dependency_overrides[get_db] = override_get_db
     
-    # Set API key for tests
+    # Set API keys for tests
     os.environ["API_KEY"] = TEST_API_KEY
+    os.environ["ADMIN_API_KEY"] = TEST_ADMIN_API_KEY
     
     with TestClient(app) as test_client:
         yield test_client
@@ -74,6 +76,12 @@ def api_headers():
     return {"X-API-Key": TEST_API_KEY}
 
 
+@pytest.fixture
+def admin_headers():
+    """Return headers with the admin API key (/v1/admin/*)."""
+    return {"X-API-Key": TEST_ADMIN_API_KEY}
+
+
 @pytest.fixture
 def sample_event_payload():
     """Return a sample event payload."""
@@ -0,0 +1,176 @@
+"""Tests for the online backup endpoint and CLI."""
+import gc
+import gzip
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app import backup, main
+from app.storage import store_for
+
+
+def _restore(tmp_path, compressed):
+    path = tmp_path / "restored.db"
+    path.write_bytes(gzip.decompress(compressed))
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT source FROM events ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("method", ["backup", "vacuum"])
+def test_backup_download(client, api_headers, admin_headers, sample_event_payload, tmp_path, method):
+    """Test that the endpoint streams a gzip snapshot containing the events."""
+    for _ in range(3):
+        client.post("/v1/events", json=sample_event_payload, headers=api_headers)
+
+    response = client.get(f"/v1/admin/backup?method={method}", headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert ".db.gz" in response.headers["content-disposition"]
+    assert _restore(tmp_path, response.content) == [("test-source",)] * 3
+
+
+def test_backup_requires_admin_key(client, api_headers, monkeypatch):
+    """Test that backups need the admin key; the shared ingest key is refused."""
+    assert client.get("/v1/admin/backup").status_code == 401
+    assert client.get("/v1/admin/backup", headers=api_headers).status_code == 401
+
+    monkeypatch.delenv("ADMIN_API_KEY")
+    assert client.get("/v1/admin/backup", headers=api_headers).status_code == 403
+    monkeypatch.setenv("ADMIN_API_KEY", api_headers["X-API-Key"])
+    assert client.get("/v1/admin/backup", headers=api_headers).status_code == 403
+
+
+def test_one_backup_at_a_time(client, admin_headers):
+    """Test a second backup is refused while one is running, and allowed after it."""
+    assert main.backup_running.acquire(blocking=False)
+    try:
+        response = client.get("/v1/admin/backup", headers=admin_headers)
+        assert response.status_code == 409
+    finally:
+        main.backup_running.release()
+
+    assert client.get("/v1/admin/backup", headers=admin_headers).status_code == 200
+    assert client.get("/v1/admin/backup", headers=admin_headers).status_code == 200
+    assert not main.backup_running.locked()
+
+
+def test_backup_unsent_body_releases(client, test_db_session, tmp_path, monkeypatch):
+    """Test the lock and the snapshot file are released when the body is never streamed."""
+    monkeypatch.setenv("BACKUP_TMPDIR", str(tmp_path))
+    response = main.download_backup(method="backup", shard=None, store=store_for(test_db_session), router=None)
+    assert main.backup_running.locked()
+    assert len(list(tmp_path.iterdir())) == 1
+
+    del response
+    gc.collect()
+    assert not main.backup_running.locked()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_backup_invalid_method(client, admin_headers):
+    """Test that unknown methods are rejected."""
+    response = client.get("/v1/admin/backup?method=copy", headers=admin_headers)
+    assert response.status_code == 422
+
+
+def test_backup_in_small_steps(tmp_path, monkeypatch):
+    """Test the paged backup with a one-page step size."""
+    monkeypatch.setenv("BACKUP_PAGES", "1")
+    monkeypatch.setenv("BACKUP_SLEEP_MS", "0")
+    source = sqlite3.connect(tmp_path / "src.db")
+    source.execute("CREATE TABLE t (v TEXT)")
+    source.executemany("INSERT INTO t VALUES (?)", [("x" * 1000,)] * 200)
+    source.commit()
+
+    backup.snapshot(source, str(tmp_path / "copy.db"))
+    source.close()
+
+    copy = sqlite3.connect(tmp_path / "copy.db")
+    assert copy.execute("SELECT count(*) FROM t").fetchone()[0] == 200
+    copy.close()
+
+
+def test_backup_cli(tmp_path):
+    """Test the command-line backup writes a gzip file and cleans up."""
+    source = sqlite3.connect(tmp_path / "app.db")
+    source.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, source TEXT)")
+    source.execute("INSERT INTO events (source) VALUES ('cli')")
+    source.commit()
+    source.close()
+    out = tmp_path / "out.db.gz"
+
+    assert backup.main([str(out), "--database-url", f"sqlite:///{tmp_path / 'app.db'}"]) == 0
+
+    assert _restore(tmp_path, out.read_bytes()) == [("cli",)]
+
+
+def test_backup_cli_per_shard(tmp_path, monkeypatch):
+    """Test the CLI needs --shard with SHARD_COUNT > 1 and copies that shard's file."""
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setattr("app.db.DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    source = sqlite3.connect(tmp_path / "app.shard1.db")
+    source.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, source TEXT)")
+    source.execute("INSERT INTO events (source) VALUES ('shard1')")
+    source.commit()
+    source.close()
+    out = tmp_path / "out.db.gz"
+
+    with pytest.raises(SystemExit):
+        backup.main([str(out)])
+    with pytest.raises(SystemExit):
+        backup.main([str(out), "--shard", "2"])
+    assert backup.main([str(out), "--shard", "1"]) == 0
+
+    assert _restore(tmp_path, out.read_bytes()) == [("shard1",)]
+
+
+def test_backup_completes_under_concurrent_writes(tmp_path, monkeypatch):
+    """Test a WAL backup finishes while another connection keeps committing."""
+    monkeypatch.setenv("BACKUP_PAGES", "1")  # a paged copy restarts after every commit
+    path = tmp_path / "busy.db"
+    setup = sqlite3.connect(path)
+    setup.execute("PRAGMA journal_mode = WAL")
+    setup.execute("CREATE TABLE t (v TEXT)")
+    setup.executemany("INSERT INTO t VALUES (?)", [("x" * 1000,)] * 20000)
+    setup.commit()
+    setup.close()
+
+    stop = threading.Event()
+    commits = []
+
+    def writer():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        while not stop.is_set():
+            conn.execute("INSERT INTO t VALUES ('w')")
+            conn.commit()
+            commits.append(1)
+            time.sleep(0.002)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        while len(commits) < 5:
+            time.sleep(0.01)
+        source = sqlite3.connect(path, check_same_thread=False)
+        copier = threading.Thread(target=backup.snapshot, args=(source, str(tmp_path / "copy.db")), daemon=True)
+        copier.start()
+        copier.join(timeout=10)
+        finished = not copier.is_alive()
+        before_stop = len(commits)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert finished, "backup did not complete while writes were arriving"
+    source.close()
+    copy = sqlite3.connect(tmp_path / "copy.db")
+    assert copy.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert 20000 + 5 <= copy.execute("SELECT count(*) FROM t").fetchone()[0] <= 20000 + before_stop
+    copy.close()
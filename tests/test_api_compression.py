@@ -0,0 +1,111 @@
+"""Tests for response compression."""
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import compression
+from app.compression import CompressionMiddleware, accepted_encodings, choose_encoding
+
+
+def _create_many(client, api_headers, count=20):
+    for i in range(count):
+        body = {"payload": {"stid": f"st-{i}", "exnum": "EX1", "table": {f"test{j}": j % 2 == 0 for j in range(20)}}}
+        client.post("/v1/events", json=body, headers=api_headers)
+
+
+def test_accept_encoding_parsing():
+    """Test q-value parsing of Accept-Encoding."""
+    assert accepted_encodings("gzip, deflate;q=0.5, br;q=0") == {"gzip": 1.0, "deflate": 0.5, "br": 0.0}
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") in ("gzip", "zstd")
+
+
+def test_choose_encoding_without_zstd(monkeypatch):
+    """Test gzip is chosen when zstandard is not installed."""
+    monkeypatch.setattr(compression, "zstandard", None)
+    assert choose_encoding("zstd, gzip") == "gzip"
+    assert choose_encoding("zstd") is None
+
+
+def test_large_list_is_gzipped(client, api_headers):
+    """Test that a payload-heavy list response is compressed."""
+    _create_many(client, api_headers)
+
+    response = client.get("/v1/events?limit=200", headers={**api_headers, "Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content) / 3
+    assert len(response.json()) == 20
+
+
+def test_uncompressed_without_accept_encoding(client, api_headers):
+    """Test identity responses when the client does not accept gzip."""
+    _create_many(client, api_headers)
+
+    response = client.get("/v1/events", headers={**api_headers, "Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 20
+
+
+def test_small_responses_not_compressed(client, api_headers, sample_event_payload):
+    """Test responses under the size threshold are sent as-is."""
+    client.post("/v1/events", json=sample_event_payload, headers=api_headers)
+
+    response = client.get("/v1/events", headers={**api_headers, "Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+
+
+def test_health_excluded(client):
+    """Test /health is never compressed."""
+    response = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_backup_not_double_compressed(client, api_headers, admin_headers, sample_event_payload):
+    """Test already-encoded responses pass through."""
+    client.post("/v1/events", json=sample_event_payload, headers=api_headers)
+
+    response = client.get("/v1/admin/backup", headers={**admin_headers, "Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress(response.content).startswith(b"SQLite format 3")
+
+
+def _streaming_app(**options):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **options)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"row %d\n" % i * 50 for i in range(100)), media_type="text/plain")
+
+    return TestClient(app)
+
+
+def test_streaming_response_compressed():
+    """Test streaming responses are compressed chunk by chunk."""
+    client = _streaming_app(minimum_size=10, gzip_level=1, exclude_paths=[])
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == b"".join(b"row %d\n" % i * 50 for i in range(100))
+
+
+@pytest.mark.skipif(compression.zstandard is None, reason="zstandard not installed")
+def test_zstd_preferred_when_available(client, api_headers):
+    """Test zstd is negotiated when supported by both sides."""
+    _create_many(client, api_headers)
+
+    response = client.get("/v1/events", headers={**api_headers, "Accept-Encoding": "zstd, gzip"}, )
+
+    assert response.headers["content-encoding"] == "zstd"
@@ -0,0 +1,99 @@
+"""Tests for columnar payload.table storage and the columns endpoint."""
+import pytest
+
+from app.columnar import backfill, table_cells
+from app.models import EventCell
+
+
+@pytest.fixture
+def cells_on(monkeypatch):
+    monkeypatch.setenv("TABLE_CELLS", "1")
+
+
+def _create(client, api_headers, stid, exnum, table):
+    body = {"payload": {"stid": stid, "exnum": exnum, "table": table}}
+    response = client.post("/v1/events", json=body, headers=api_headers)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_table_cells_shapes():
+    """Test cell decomposition of each supported table shape."""
+    assert list(table_cells({"a": 1, "b": "x"})) == [("a", 0, 1), ("b", 0, "x")]
+    assert list(table_cells({"a": [1, 2]})) == [("a", 0, 1), ("a", 1, 2)]
+    assert list(table_cells([{"a": 1}, {"a": 2, "b": 3}])) == [("a", 0, 1), ("a", 1, 2), ("b", 1, 3)]
+    assert list(table_cells([[1, 2]])) == [("0", 0, 1), ("1", 0, 2)]
+    assert list(table_cells(None)) == []
+
+
+def test_cells_written_when_enabled(client, api_headers, test_db_session, cells_on):
+    """Test that create_event stores typed cells."""
+    event_id = _create(client, api_headers, "st-1", "EX1", {"Insert": True, "score": [1, 2.5]})
+
+    cells = test_db_session.query(EventCell).filter_by(event_id=event_id).order_by(
+        EventCell.column_name, EventCell.row_index
+    ).all()
+    assert [(c.column_name, c.row_index, c.value) for c in cells] == [
+        ("Insert", 0, True), ("score", 0, 1), ("score", 1, 2.5),
+    ]
+    assert {(c.exnum, c.stid) for c in cells} == {("EX1", "st-1")}
+
+
+def test_cells_not_written_by_default(client, api_headers, test_db_session):
+    """Test that columnar storage is opt-in."""
+    _create(client, api_headers, "st-1", "EX1", {"Insert": True})
+    assert test_db_session.query(EventCell).count() == 0
+
+
+def test_fetch_selected_columns(client, api_headers, cells_on):
+    """Test reading selected columns of one exercise across students."""
+    first = _create(client, api_headers, "st-1", "EX1", {"Insert": True, "Remove": False, "Valgrind": True})
+    second = _create(client, api_headers, "st-2", "EX1", {"Insert": False, "Remove": True, "Valgrind": False})
+    _create(client, api_headers, "st-3", "EX2", {"Insert": True})
+
+    response = client.get("/v1/events/columns?exnum=EX1&column=Insert&column=Valgrind", headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": second, "stid": "st-2", "columns": {"Insert": [False], "Valgrind": [False]}},
+        {"id": first, "stid": "st-1", "columns": {"Insert": [True], "Valgrind": [True]}},
+    ]
+
+
+def test_fetch_latest_per_student(client, api_headers, cells_on):
+    """Test latest=true keeps only each student's newest submission."""
+    _create(client, api_headers, "st-1", "EX1", {"Insert": False})
+    newest = _create(client, api_headers, "st-1", "EX1", {"Insert": True})
+    other = _create(client, api_headers, "st-2", "EX1", {"Insert": False})
+
+    response = client.get("/v1/events/columns?exnum=EX1&column=Insert&latest=true", headers=api_headers)
+
+    assert [r["id"] for r in response.json()] == [other, newest]
+    assert response.json()[1]["columns"] == {"Insert": [True]}
+
+
+def test_fetch_filtered_by_stid(client, api_headers, cells_on):
+    """Test the stid filter."""
+    _create(client, api_headers, "st-1", "EX1", {"Insert": True})
+    wanted = _create(client, api_headers, "st-2", "EX1", {"Insert": False})
+
+    response = client.get("/v1/events/columns?exnum=EX1&column=Insert&stid=st-2", headers=api_headers)
+
+    assert [r["id"] for r in response.json()] == [wanted]
+
+
+def test_fetch_requires_column(client, api_headers):
+    """Test that at least one column must be requested."""
+    response = client.get("/v1/events/columns?exnum=EX1", headers=api_headers)
+    assert response.status_code == 422
+
+
+def test_backfill(client, api_headers, test_db_session):
+    """Test that backfill fills cells for events stored without them."""
+    ids = [_create(client, api_headers, f"st-{i}", "EX1", {"Insert": i % 2 == 0}) for i in range(3)]
+
+    assert backfill(test_db_session, batch_size=2) == 3
+    assert backfill(test_db_session) == 0
+
+    response = client.get("/v1/events/columns?exnum=EX1&column=Insert", headers=api_headers)
+    assert [r["id"] for r in response.json()] == ids[::-1]
@@ -0,0 +1,199 @@
+"""Tests for delta-encoded submission storage and history."""
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app import jsonpatch
+from app.columnar import backfill, fetch_columns
+from app.models import Event, EventVersion
+
+
+@pytest.fixture
+def history_on(monkeypatch):
+    monkeypatch.setenv("DELTA_HISTORY", "1")
+    monkeypatch.setenv("DELTA_SNAPSHOT_EVERY", "3")
+
+
+def _submit(client, api_headers, table, stid="st-1", exnum="EX1"):
+    body = {"payload": {"stid": stid, "exnum": exnum, "table": table}}
+    response = client.post("/v1/events", json=body, headers=api_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _tables(n):
+    """n successive submissions that each flip one result."""
+    base = {f"test{i}": False for i in range(8)}
+    out = []
+    for i in range(n):
+        base = {**base, f"test{i % 8}": True}
+        out.append(dict(base))
+    return out
+
+
+@pytest.mark.parametrize("old,new", [
+    ({"a": 1, "b": [1, 2, 3]}, {"a": 2, "b": [1, 3], "c": {"x/y": "~"}}),
+    ({"a": True}, {"a": 1}),
+    ([1, 2], [1, 2, 3, 4]),
+    ({"a": {"b": None}}, {"a": {}}),
+    ("x", {"y": 1}),
+])
+def test_jsonpatch_roundtrip(old, new):
+    """Test that applying a diff reproduces the new document."""
+    assert jsonpatch.apply(old, jsonpatch.diff(old, new)) == new
+
+
+def test_jsonpatch_small_change_is_small():
+    """Test that a single changed cell becomes a single replace op."""
+    old = {"table": {"Insert": True, "Remove": False}}
+    new = {"table": {"Insert": True, "Remove": True}}
+    assert jsonpatch.diff(old, new) == [{"op": "replace", "path": "/table/Remove", "value": True}]
+
+
+def test_versions_stored_as_snapshots_and_deltas(client, api_headers, test_db_session, history_on):
+    """Test the snapshot/delta layout of a chain."""
+    for table in _tables(5):
+        _submit(client, api_headers, table)
+
+    rows = test_db_session.query(EventVersion).order_by(EventVersion.version).all()
+    assert [r.version for r in rows] == [1, 2, 3, 4, 5]
+    assert [r.is_snapshot for r in rows] == [True, False, False, True, False]
+    assert rows[1].doc == [{"op": "replace", "path": "/table/test1", "value": True}]
+    # only snapshots keep a payload in events, and only deltas a doc
+    payloads = {e.id: e.payload for e in test_db_session.query(Event)}
+    assert [payloads[r.event_id] is not None for r in rows] == [r.is_snapshot for r in rows]
+    assert [r.doc is None for r in rows] == [r.is_snapshot for r in rows]
+
+
+def test_deltas_save_storage(client, api_headers, test_db_session, history_on):
+    """Test a chain stores much less than its full payloads."""
+    tables = _tables(12)
+    for t in tables:
+        _submit(client, api_headers, {**t, "output": "x" * 500})
+
+    stored = test_db_session.execute(text(
+        "SELECT sum(length(e.payload)) + sum(length(v.doc)) FROM events AS e JOIN event_versions AS v ON v.event_id = e.id"
+    )).scalar()
+    full = sum(len(json.dumps({"stid": "st-1", "exnum": "EX1", "table": {**t, "output": "x" * 500}})) for t in tables)
+    assert stored < full / 2
+
+
+def test_deltas_rebuilt_on_reads(client, api_headers, history_on):
+    """Test list, lookup, search and create return full payloads for delta-stored versions."""
+    tables = _tables(5)
+    created = [_submit(client, api_headers, t) for t in tables]
+    _submit(client, api_headers, {"other": True}, stid="st-2")
+
+    assert [c["payload"]["table"] for c in created] == tables
+
+    listed = client.get("/v1/events?limit=10", headers=api_headers).json()
+    assert [e["payload"]["table"] for e in listed[1:]] == tables[::-1]
+
+    latest = client.get("/v1/events/st-1?exnum=EX1", headers=api_headers).json()
+    assert latest["id"] == created[-1]["id"]
+    assert latest["payload"]["table"] == tables[-1]
+
+    hits = client.get('/v1/events/search?q=stid:"st-1"', headers=api_headers).json()
+    assert sorted((h["id"], h["payload"]["table"]) for h in hits) == [
+        (c["id"], t) for c, t in zip(created, tables)
+    ]
+
+
+def test_lookup_after_unversioned_event(client, api_headers, history_on, monkeypatch):
+    """Test the lookup returns an event stored with history off after the chain's head."""
+    for t in _tables(2):
+        _submit(client, api_headers, t)
+    monkeypatch.setenv("DELTA_HISTORY", "0")
+    newest = _submit(client, api_headers, {"plain": True})
+
+    latest = client.get("/v1/events/st-1?exnum=EX1", headers=api_headers).json()
+    assert latest["id"] == newest["id"]
+
+
+def test_backfill_rebuilds_deltas(client, api_headers, test_db_session, history_on):
+    """Test the event_cells backfill writes the cells of delta-stored versions."""
+    tables = _tables(4)
+    for t in tables:
+        _submit(client, api_headers, t)
+
+    assert backfill(test_db_session) == 4
+    rows = fetch_columns(test_db_session, "EX1", ["test3"])
+    assert [r["columns"]["test3"] for r in rows] == [[t["test3"]] for t in tables[::-1]]
+
+
+def test_full_payload_layout_still_read(client, api_headers, test_db_session, history_on):
+    """Test chains stored with full payloads and full snapshot docs read the same."""
+    tables = _tables(5)
+    created = [_submit(client, api_headers, t) for t in tables]
+    for c, t in zip(created, tables):
+        payload = {"stid": "st-1", "exnum": "EX1", "table": t}
+        test_db_session.query(Event).filter(Event.id == c["id"]).update({"payload": payload})
+        test_db_session.query(EventVersion).filter(
+            EventVersion.event_id == c["id"], EventVersion.is_snapshot
+        ).update({"doc": payload})
+    test_db_session.commit()
+
+    history = client.get("/v1/events/st-1/history?exnum=EX1", headers=api_headers).json()
+    assert [h["payload"]["table"] for h in history] == tables
+    diffs = client.get("/v1/events/st-1/history?exnum=EX1&diffs=true", headers=api_headers).json()
+    assert diffs[1]["patch"] == [{"op": "replace", "path": "/table/test1", "value": True}]
+
+
+def test_history_reconstructs_versions(client, api_headers, history_on):
+    """Test that every version is rebuilt exactly."""
+    tables = _tables(7)
+    created = [_submit(client, api_headers, t) for t in tables]
+    _submit(client, api_headers, {"other": True}, stid="st-2")
+
+    response = client.get("/v1/events/st-1/history?exnum=EX1", headers=api_headers)
+
+    assert response.status_code == 200
+    history = response.json()
+    assert [h["version"] for h in history] == list(range(1, 8))
+    assert [h["event_id"] for h in history] == [c["id"] for c in created]
+    assert [h["payload"]["table"] for h in history] == tables
+
+
+def test_history_window(client, api_headers, history_on):
+    """Test limit/until select a window that starts between snapshots."""
+    tables = _tables(8)
+    for t in tables:
+        _submit(client, api_headers, t)
+
+    response = client.get("/v1/events/st-1/history?exnum=EX1&limit=2&until=6", headers=api_headers)
+
+    history = response.json()
+    assert [h["version"] for h in history] == [5, 6]
+    assert [h["payload"]["table"] for h in history] == tables[4:6]
+
+
+def test_history_diffs(client, api_headers, history_on):
+    """Test diffs=true returns one full payload followed by patches."""
+    tables = _tables(5)
+    for t in tables:
+        _submit(client, api_headers, t)
+
+    response = client.get("/v1/events/st-1/history?exnum=EX1&diffs=true", headers=api_headers)
+
+    history = response.json()
+    assert history[0]["payload"]["table"] == tables[0]
+    assert all(h["payload"] is None for h in history[1:])
+    doc = history[0]["payload"]
+    for h, expected in zip(history[1:], tables[1:]):
+        doc = jsonpatch.apply(doc, h["patch"])
+        assert doc["table"] == expected
+    # version 4 is a stored snapshot but is still returned as a patch
+    assert history[3]["patch"] == [{"op": "replace", "path": "/table/test3", "value": True}]
+
+
+def test_history_not_found(client, api_headers, history_on):
+    """Test unknown chains return 404."""
+    response = client.get("/v1/events/nobody/history?exnum=EX1", headers=api_headers)
+    assert response.status_code == 404
+
+
+def test_history_disabled_by_default(client, api_headers, test_db_session):
+    """Test that nothing is recorded unless DELTA_HISTORY is set."""
+    _submit(client, api_headers, {"a": 1})
+    assert test_db_session.query(EventVersion).count() == 0
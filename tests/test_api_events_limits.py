@@ -0,0 +1,114 @@
+"""Tests for request body size and payload-shape limits."""
+import json
+
+import pytest
+
+from app.limits import json_depth, table_shape
+
+
+def _event(table):
+    return {"source": "limits", "payload": {"stid": "s1", "exnum": "EX1", "table": table}}
+
+
+def test_json_depth():
+    """Test the raw-bytes depth scan ignores brackets inside strings."""
+    assert json_depth(b'{"a": 1}') == 1
+    assert json_depth(b'{"a": [[{"b": []}]]}') == 5
+    assert json_depth(b'{"a": "[[[[{{{{"}') == 1
+    assert json_depth(b'{"a": "quote \\" [[["}') == 1
+    assert json_depth(b'123') == 0
+
+
+def test_table_shape():
+    """Test row/column counting for the supported table shapes."""
+    assert table_shape({"a": 1, "b": 2}) == (1, 2)
+    assert table_shape({"a": [1, 2, 3], "b": [1]}) == (3, 2)
+    assert table_shape([{"a": 1}, {"a": 2, "b": 3}]) == (2, 2)
+    assert table_shape([[1, 2, 3]]) == (1, 3)
+    assert table_shape({}) == (0, 0)
+
+
+def test_body_too_large(client, api_headers, monkeypatch):
+    """Test that bodies over MAX_BODY_BYTES are rejected with 413."""
+    monkeypatch.setenv("MAX_BODY_BYTES", "200")
+    body = _event({"blob": "x" * 500})
+    response = client.post("/v1/events", json=body, headers=api_headers)
+
+    assert response.status_code == 413
+
+
+def test_body_too_large_streamed(client, api_headers, monkeypatch):
+    """Test that a chunked body without Content-Length is cut off while streaming."""
+    monkeypatch.setenv("MAX_BODY_BYTES", "200")
+    raw = json.dumps(_event({"blob": "x" * 500})).encode()
+
+    def chunks():
+        for i in range(0, len(raw), 64):
+            yield raw[i:i + 64]
+
+    response = client.post("/v1/events", content=chunks(), headers={**api_headers, "Content-Type": "application/json"})
+
+    assert response.status_code == 413
+
+
+def test_nesting_too_deep(client, api_headers, monkeypatch):
+    """Test that deeply nested payloads are rejected."""
+    monkeypatch.setenv("MAX_JSON_DEPTH", "10")
+    nested = {}
+    for _ in range(20):
+        nested = {"n": nested}
+    response = client.post("/v1/events", json=_event(nested), headers=api_headers)
+
+    assert response.status_code == 422
+    assert "nesting" in response.json()["detail"]
+
+
+def test_too_many_keys(client, api_headers, monkeypatch):
+    """Test that the key budget is enforced."""
+    monkeypatch.setenv("MAX_JSON_KEYS", "50")
+    table = {f"k{i}": i for i in range(100)}
+    response = client.post("/v1/events", json=_event(table), headers=api_headers)
+
+    assert response.status_code == 422
+    assert "keys" in response.json()["detail"]
+
+
+def test_table_too_many_rows(client, api_headers, monkeypatch):
+    """Test that table row limit is enforced."""
+    monkeypatch.setenv("MAX_TABLE_ROWS", "10")
+    response = client.post("/v1/events", json=_event({"col": list(range(11))}), headers=api_headers)
+
+    assert response.status_code == 422
+    assert "rows" in response.json()["detail"]
+
+
+def test_table_too_many_columns(client, api_headers, monkeypatch):
+    """Test that table column limit is enforced."""
+    monkeypatch.setenv("MAX_TABLE_COLUMNS", "3")
+    response = client.post("/v1/events", json=_event({"a": 1, "b": 2, "c": 3, "d": 4}), headers=api_headers)
+
+    assert response.status_code == 422
+    assert "columns" in response.json()["detail"]
+
+
+def test_within_limits_accepted(client, api_headers, monkeypatch):
+    """Test that a payload at the limits is accepted."""
+    monkeypatch.setenv("MAX_TABLE_ROWS", "10")
+    monkeypatch.setenv("MAX_TABLE_COLUMNS", "3")
+    body = _event({"a": list(range(10)), "b": 2, "c": 3})
+    response = client.post("/v1/events", json=body, headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json()["payload"] == body["payload"]
+
+
+def test_invalid_json(client, api_headers):
+    """Test that malformed JSON is a validation error."""
+    response = client.post(
+        "/v1/events",
+        content=b'{"payload": {',
+        headers={**api_headers, "Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
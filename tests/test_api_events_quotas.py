@@ -0,0 +1,76 @@
+"""Tests for per-source ingestion quotas."""
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.main import source_quotas
+from app.storage import SQLiteEventStore
+
+
+@pytest.fixture(autouse=True)
+def fresh_quotas(monkeypatch):
+    monkeypatch.setattr(source_quotas, "_buckets", {})
+    monkeypatch.setenv("SOURCE_QUOTA_PER_MINUTE", "3")
+
+
+def _event(source):
+    return {"source": source, "payload": {"stid": "st-1", "exnum": "EX1", "table": {}}}
+
+
+def test_quota_per_source(client, api_headers):
+    """Test a source over its quota gets 429 while other sources still write."""
+    for _ in range(3):
+        assert client.post("/v1/events", json=_event("heavy"), headers=api_headers).status_code == 200
+
+    response = client.post("/v1/events", json=_event("heavy"), headers=api_headers)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["retry-after"]) <= 20
+    assert client.post("/v1/events", json=_event("light"), headers=api_headers).status_code == 200
+    assert len(client.get("/v1/events", headers=api_headers).json()) == 4
+
+
+def test_batch_charged_as_a_whole(client, api_headers):
+    """Test a batch over the quota inserts nothing."""
+    batch = {"events": [_event("heavy")] * 2 + [_event("other")]}
+    assert client.post("/v1/events/batch", json=batch, headers=api_headers).status_code == 200
+
+    response = client.post("/v1/events/batch", json=batch, headers=api_headers)
+    assert response.status_code == 429
+    assert len(client.get("/v1/events", headers=api_headers).json()) == 3
+    # the rejected batch took no tokens from "other"
+    assert client.post("/v1/events", json=_event("other"), headers=api_headers).status_code == 200
+
+
+def test_batch_larger_than_burst(client, api_headers):
+    """Test a batch that can never fit is rejected for good (413, no Retry-After)."""
+    response = client.post("/v1/events/batch", json={"events": [_event("x")] * 4}, headers=api_headers)
+    assert response.status_code == 413
+    assert "retry-after" not in response.headers
+    # and it took no tokens
+    batch = {"events": [_event("x")] * 3}
+    assert client.post("/v1/events/batch", json=batch, headers=api_headers).status_code == 200
+
+
+def test_failed_insert_refunds_quota(client, api_headers, monkeypatch):
+    """Test events refused by the database (503) do not use up the source's quota."""
+    def locked(*args, **kwargs):
+        raise OperationalError("INSERT ...", {}, sqlite3.OperationalError("database is locked"))
+
+    with monkeypatch.context() as m:
+        m.setattr(SQLiteEventStore, "add", locked)
+        m.setattr(SQLiteEventStore, "add_many", locked)
+        for _ in range(3):
+            assert client.post("/v1/events", json=_event("busy"), headers=api_headers).status_code == 503
+        batch = {"events": [_event("busy")] * 3}
+        assert client.post("/v1/events/batch", json=batch, headers=api_headers).status_code == 503
+
+    for _ in range(3):
+        assert client.post("/v1/events", json=_event("busy"), headers=api_headers).status_code == 200
+
+
+def test_quota_disabled(client, api_headers, monkeypatch):
+    """Test no limit applies with SOURCE_QUOTA_PER_MINUTE=0."""
+    monkeypatch.setenv("SOURCE_QUOTA_PER_MINUTE", "0")
+    for _ in range(5):
+        assert client.post("/v1/events", json=_event("heavy"), headers=api_headers).status_code == 200
@@ -0,0 +1,125 @@
+"""Tests for the full-text search endpoint."""
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import main
+
+
+def _create(client, api_headers, stid, exnum, table, source="search-test"):
+    body = {"source": source, "payload": {"stid": stid, "exnum": exnum, "table": table}}
+    response = client.post("/v1/events", json=body, headers=api_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_search_matches_table_content(client, api_headers):
+    """Test that words inside payload.table are searchable."""
+    hit = _create(client, api_headers, "st-1", "EX1", {"Valgrind": False, "note": "segmentation fault"})
+    _create(client, api_headers, "st-2", "EX1", {"Valgrind": True, "note": "all good"})
+
+    response = client.get("/v1/events/search?q=segmentation", headers=api_headers)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["id"] for r in results] == [hit["id"]]
+    assert results[0]["payload"] == hit["payload"]
+    assert "[segmentation]" in results[0]["snippet"]
+    assert isinstance(results[0]["rank"], float)
+
+
+def test_search_column_filter(client, api_headers):
+    """Test FTS5 column filters on stid/exnum."""
+    _create(client, api_headers, "st-1", "EX1", {"Insert": True})
+    second = _create(client, api_headers, "st-1", "EX2", {"Insert": True})
+
+    response = client.get('/v1/events/search?q=exnum:EX2 AND Insert', headers=api_headers)
+
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [second["id"]]
+
+
+def test_search_ranked_by_relevance(client, api_headers):
+    """Test that better matches come first."""
+    weak = _create(client, api_headers, "st-1", "EX1", {"a": "timeout", "b": "ok", "c": "ok", "d": "ok"})
+    strong = _create(client, api_headers, "st-2", "EX1", {"a": "timeout", "b": "timeout"})
+
+    response = client.get("/v1/events/search?q=timeout", headers=api_headers)
+
+    assert [r["id"] for r in response.json()] == [strong["id"], weak["id"]]
+
+
+def test_search_limit(client, api_headers):
+    """Test that limit applies to search results."""
+    for i in range(5):
+        _create(client, api_headers, f"st-{i}", "EX1", {"result": "passed"})
+
+    response = client.get("/v1/events/search?q=passed&limit=2", headers=api_headers)
+
+    assert len(response.json()) == 2
+
+
+def test_search_no_results(client, api_headers, sample_event_payload):
+    """Test a query without matches."""
+    client.post("/v1/events", json=sample_event_payload, headers=api_headers)
+
+    response = client.get("/v1/events/search?q=nothinglikethis", headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_search_invalid_syntax(client, api_headers):
+    """Test that malformed FTS5 queries return 400."""
+    response = client.get('/v1/events/search?q="unbalanced', headers=api_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("q", ["AND", "nosuchcolumn:x", "*"])
+def test_search_invalid_query_variants(client, api_headers, q):
+    """Test that other FTS5 query errors return 400 too."""
+    response = client.get("/v1/events/search", params={"q": q}, headers=api_headers)
+    assert response.status_code == 400
+
+
+def test_search_database_busy_is_not_a_bad_query(client, api_headers, monkeypatch):
+    """Test that a locked database during search answers 503, not 400."""
+    def locked(*args, **kwargs):
+        raise OperationalError("SELECT ...", {}, sqlite3.OperationalError("database is locked"))
+
+    monkeypatch.setattr(main, "search_events", locked)
+    response = client.get("/v1/events/search?q=Insert", headers=api_headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_search_requires_query(client, api_headers):
+    """Test that q is required."""
+    assert client.get("/v1/events/search", headers=api_headers).status_code == 422
+
+
+def test_search_requires_api_key(client):
+    """Test that search requires authentication."""
+    assert client.get("/v1/events/search?q=x").status_code == 401
+
+
+def test_search_backfills_existing_events(test_db_engine):
+    """Test that events inserted before the index existed are backfilled."""
+    from sqlalchemy import text
+
+    from app.db import Base
+
+    with test_db_engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE events_fts")
+        for suffix in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER events_fts_{suffix}")
+        conn.execute(text(
+            "INSERT INTO events (received_at, source, payload) "
+            "VALUES (CURRENT_TIMESTAMP, 'old', '{\"stid\": \"s\", \"exnum\": \"E\", \"table\": {\"k\": \"legacy\"}}')"
+        ))
+    Base.metadata.create_all(bind=test_db_engine)
+
+    with test_db_engine.connect() as conn:
+        found = conn.exec_driver_sql("SELECT rowid FROM events_fts WHERE events_fts MATCH 'legacy'").all()
+    assert len(found) == 1
@@ -0,0 +1,169 @@
+"""Tests for the bulk import CLI."""
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from app import bulk_import
+
+
+def _write_ndjson(path, count, start=0):
+    with open(path, "w") as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({
+                "source": "backfill",
+                "received_at": "2023-05-01T10:00:00+02:00",
+                "payload": {"stid": f"st-{i}", "exnum": "EX1", "table": {"i": i}},
+            }) + "\n")
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'import.db'}"
+
+
+def _events(database_url):
+    conn = sqlite3.connect(database_url.removeprefix("sqlite:///"))
+    try:
+        return conn.execute("SELECT received_at, source, payload FROM events ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_import_ndjson(tmp_path, database_url):
+    """Test importing an NDJSON file in several batches."""
+    path = tmp_path / "events.ndjson"
+    _write_ndjson(path, 25)
+
+    assert bulk_import.main([str(path), "--database-url", database_url, "--batch-size", "10", "--quiet"]) == 0
+
+    rows = _events(database_url)
+    assert len(rows) == 25
+    assert rows[0][0] == "2023-05-01 08:00:00.000000"  # converted to UTC
+    assert rows[0][1] == "backfill"
+    assert json.loads(rows[24][2]) == {"stid": "st-24", "exnum": "EX1", "table": {"i": 24}}
+
+
+def test_import_csv(tmp_path, database_url):
+    """Test importing a CSV file with stid/exnum/table columns."""
+    path = tmp_path / "events.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "stid", "exnum", "table", "grade"])
+        writer.writerow(["csv", "st-1", "EX2", json.dumps({"Insert": True}), "90"])
+        writer.writerow(["", "st-2", "EX2", json.dumps({"Insert": False}), "40"])
+
+    bulk_import.main([str(path), "--database-url", database_url, "--quiet", "--fast", "--defer-indexes"])
+
+    rows = _events(database_url)
+    assert [r[1] for r in rows] == ["csv", None]
+    assert json.loads(rows[0][2]) == {"stid": "st-1", "exnum": "EX2", "table": {"Insert": True}, "grade": "90"}
+    assert rows[0][0] is not None  # server default applied
+
+
+def test_invalid_records_rejected(tmp_path, database_url):
+    """Test that malformed records are skipped and counted."""
+    path = tmp_path / "events.ndjson"
+    with open(path, "w") as f:
+        f.write('{"payload": {"stid": "a", "exnum": "EX1", "table": {}}}\n')
+        f.write("not json\n")
+        f.write('{"payload": {"stid": "b", "exnum": "EX1"}}\n')
+        f.write("\n")
+
+    conn = bulk_import.connect(database_url)
+    result = bulk_import.import_file(conn, str(path))
+    conn.close()
+
+    assert result["imported"] == 1
+    assert result["rejected"] == 2
+
+
+def test_wrongly_typed_fields_rejected(tmp_path, database_url):
+    """Test that a non-string source or received_at rejects the record, not the import."""
+    path = tmp_path / "events.ndjson"
+    payload = {"stid": "a", "exnum": "EX1", "table": {}}
+    with open(path, "w") as f:
+        f.write(json.dumps({"source": 5, "payload": payload}) + "\n")
+        f.write(json.dumps({"received_at": 12, "payload": payload}) + "\n")
+        f.write(json.dumps({"source": "ok", "payload": payload}) + "\n")
+
+    conn = bulk_import.connect(database_url)
+    result = bulk_import.import_file(conn, str(path))
+    conn.close()
+
+    assert result["imported"] == 1
+    assert result["rejected"] == 2
+    assert [r[1] for r in _events(database_url)] == ["ok"]
+
+
+def test_sharded_resume_after_partial_commit(tmp_path):
+    """Test a run interrupted between two shards' commits resumes without duplicates."""
+    conns = [bulk_import.connect(f"sqlite:///{tmp_path / f'shard{i}.db'}") for i in range(2)]
+    path = tmp_path / "events.ndjson"
+    _write_ndjson(path, 10)
+
+    def shard_for(source, payload):
+        return int(payload["stid"].split("-")[1]) % 2
+
+    assert bulk_import.import_file(conns, str(path), batch_size=4, shard_for=shard_for)["imported"] == 10
+    # as if the run had stopped with shard 0 committed up to st-3 and shard 1 up to st-7
+    ends = [len(line) for line in path.read_bytes().splitlines(keepends=True)]
+    for conn, last, kept in ((conns[0], 3, 2), (conns[1], 7, 4)):
+        conn.execute("DELETE FROM events WHERE CAST(substr(json_extract(payload, '$.stid'), 4) AS INTEGER) > ?", (last,))
+        conn.execute("UPDATE bulk_import_checkpoints SET position = ?, imported = ?", (sum(ends[:last + 1]), kept))
+
+    result = bulk_import.import_file(conns, str(path), batch_size=3, shard_for=shard_for)
+    stids = [
+        [json.loads(p)["stid"] for (p,) in conn.execute("SELECT payload FROM events ORDER BY id")] for conn in conns
+    ]
+    for conn in conns:
+        conn.close()
+
+    assert result["imported"] == 10
+    assert stids == [[f"st-{i}" for i in range(0, 10, 2)], [f"st-{i}" for i in range(1, 10, 2)]]
+
+
+def test_resume_from_checkpoint(tmp_path, database_url):
+    """Test that re-running after new data is appended only imports the new records."""
+    path = tmp_path / "events.ndjson"
+    _write_ndjson(path, 10)
+    conn = bulk_import.connect(database_url)
+    assert bulk_import.import_file(conn, str(path), batch_size=4)["imported"] == 10
+
+    # Re-running the same file imports nothing new
+    assert bulk_import.import_file(conn, str(path))["imported"] == 10
+
+    with open(path, "a") as f:
+        f.write(json.dumps({"payload": {"stid": "late", "exnum": "EX1", "table": {}}}) + "\n")
+    assert bulk_import.import_file(conn, str(path))["imported"] == 11
+    conn.close()
+
+    rows = _events(database_url)
+    assert len(rows) == 11
+    assert json.loads(rows[-1][2])["stid"] == "late"
+
+
+def test_deferred_indexes_rebuilt(tmp_path, database_url):
+    """Test that --defer-indexes restores the events indexes afterwards."""
+    conn = bulk_import.connect(database_url)
+    before = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'events'").fetchall()
+    conn.close()
+    assert before
+
+    path = tmp_path / "events.ndjson"
+    _write_ndjson(path, 5)
+    bulk_import.main([str(path), "--database-url", database_url, "--defer-indexes", "--quiet"])
+
+    conn = sqlite3.connect(database_url.removeprefix("sqlite:///"))
+    after = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'events'").fetchall()
+    pending = conn.execute("SELECT count(*) FROM bulk_import_deferred_indexes").fetchone()[0]
+    conn.close()
+    assert sorted(after) == sorted(before)
+    assert pending == 0
+
+
+def test_rejects_memory_database():
+    """Test that the importer refuses non file-backed databases."""
+    with pytest.raises(SystemExit):
+        bulk_import.connect("sqlite:///:memory:")
@@ -0,0 +1,51 @@
+"""Cold-start checks: importing the app is cheap and has no side effects."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Whole `import app.main`, dominated by FastAPI/SQLAlchemy/Pydantic themselves
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+# Self time of the app's own modules
+APP_MODULES_BUDGET_MS = float(os.getenv("APP_IMPORT_TIME_BUDGET_MS", "150"))
+
+
+def _importtime(tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'never-created.db'}"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+@pytest.mark.slow
+def test_import_time_budget(tmp_path):
+    """Test `import app.main` stays within the import-time budgets."""
+    timings = _importtime(tmp_path)
+
+    total_ms = timings["app.main"][1] / 1000
+    own_ms = sum(self_us for name, (self_us, _) in timings.items() if name.split(".")[0] == "app") / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"import app.main took {total_ms:.0f} ms"
+    assert own_ms < APP_MODULES_BUDGET_MS, f"app.* modules took {own_ms:.0f} ms"
+
+
+def test_import_does_not_touch_database(tmp_path):
+    """Test that importing the app neither creates the engine nor the database file."""
+    timings = _importtime(tmp_path)
+
+    assert "app.main" in timings
+    assert not (tmp_path / "never-created.db").exists()
+    # CLI-only modules are imported on demand
+    assert "app.backup" not in timings
+    assert "app.bulk_import" not in timings
@@ -0,0 +1,99 @@
+"""Tests for the background maintenance scheduler."""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from app.maintenance import MaintenanceScheduler, RequestRate
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'maint.db'}")
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        dbapi_connection.execute("PRAGMA journal_mode = WAL")
+
+    yield engine
+    engine.dispose()
+
+
+def test_request_rate():
+    """Test the sliding-window request counter."""
+    rate = RequestRate(window=10)
+    assert rate.per_second() == 0
+    for _ in range(20):
+        rate.hit()
+    assert rate.per_second() == 2.0
+
+
+def test_run_once_checkpoints_and_vacuums(file_engine, monkeypatch):
+    """Test a maintenance slice checkpoints the WAL and reclaims free pages."""
+    monkeypatch.setenv("MAINTENANCE_VACUUM_PAGES", "100000")
+    with file_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE blobs (v TEXT)"))
+        for _ in range(200):
+            conn.execute(text("INSERT INTO blobs VALUES (:v)"), {"v": "x" * 4000})
+    with file_engine.begin() as conn:
+        conn.execute(text("DELETE FROM blobs"))
+
+    scheduler = MaintenanceScheduler(lambda: file_engine, RequestRate())
+    tasks = scheduler.run_once(truncate=True)
+
+    assert tasks["wal_checkpoint"]["mode"] == "TRUNCATE"
+    assert tasks["wal_checkpoint"]["busy"] is False
+    assert tasks["incremental_vacuum"]["enabled"] is True
+    assert tasks["incremental_vacuum"]["freed_pages"] > 0
+    assert tasks["incremental_vacuum"]["free_pages"] == 0
+    assert tasks["optimize"]["runs"] == 1
+    assert scheduler.slices == 1
+
+
+def test_optimize_runs_every_n_slices(file_engine, monkeypatch):
+    """Test PRAGMA optimize only runs on every Nth slice."""
+    monkeypatch.setenv("MAINTENANCE_OPTIMIZE_EVERY", "3")
+    scheduler = MaintenanceScheduler(lambda: file_engine, RequestRate())
+    for _ in range(4):
+        scheduler.run_once()
+
+    assert scheduler.tasks["wal_checkpoint"]["runs"] == 4
+    assert scheduler.tasks["optimize"]["runs"] == 2
+
+
+def test_scheduler_skips_when_busy(file_engine, monkeypatch):
+    """Test the loop only runs slices while the request rate is idle."""
+    monkeypatch.setenv("MAINTENANCE_INTERVAL_SECONDS", "0.01")
+    monkeypatch.setenv("MAINTENANCE_IDLE_RPS", "0.5")
+    rate = RequestRate(window=10)
+    scheduler = MaintenanceScheduler(lambda: file_engine, rate)
+
+    async def run():
+        for _ in range(10):
+            rate.hit()
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    assert scheduler.skipped_busy > 0
+    assert scheduler.slices == 0
+
+
+def test_maintenance_stats_endpoint(client, admin_headers):
+    """Test the stats endpoint (scheduler disabled in tests)."""
+    response = client.get("/v1/admin/maintenance", headers=admin_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["enabled"] is False
+    assert data["running"] is False
+    assert "tasks" in data
+
+
+def test_maintenance_stats_requires_admin_key(client, api_headers):
+    """Test the stats endpoint requires the admin key."""
+    assert client.get("/v1/admin/maintenance").status_code == 401
+    assert client.get("/v1/admin/maintenance", headers=api_headers).status_code == 401
@@ -0,0 +1,206 @@
+"""Tests for sharding events across SQLite files."""
+import gzip
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import bulk_import, columnar
+from app.db import Base, make_engine
+from app.main import app, get_router
+from app.sharding import ShardRouter, shard_url
+
+
+def _event(stid, exnum="EX1", source="src"):
+    return {"source": source, "payload": {"stid": stid, "exnum": exnum, "table": {"Insert": [True]}}}
+
+
+def _make_router(tmp_path, key, count=3):
+    engines = [make_engine(f"sqlite:///{tmp_path / f'shard{i}.db'}") for i in range(count)]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+    return ShardRouter(engines, key)
+
+
+@pytest.fixture(params=["source", "exnum"])
+def router(request, client, tmp_path):
+    router = _make_router(tmp_path, request.param)
+    app.dependency_overrides[get_router] = lambda: router
+    yield router
+    for engine in router.engines:
+        engine.dispose()
+
+
+def _shard_counts(router):
+    counts = []
+    for engine in router.engines:
+        with engine.connect() as conn:
+            counts.append(conn.exec_driver_sql("SELECT count(*) FROM events").scalar())
+    return counts
+
+
+def test_shard_url():
+    """Test shard files are derived from DATABASE_URL."""
+    assert shard_url("sqlite:////data/app.db", 0) == "sqlite:////data/app.db"
+    assert shard_url("sqlite:////data/app.db", 2) == "sqlite:////data/app.shard2.db"
+    with pytest.raises(ValueError):
+        shard_url("sqlite://", 1)
+    with pytest.raises(ValueError):
+        shard_url("postgresql+psycopg://app:app@db/app", 1)
+
+
+def test_unknown_shard_key(tmp_path):
+    """Test SHARD_KEY is validated."""
+    with pytest.raises(ValueError):
+        ShardRouter([], "stid")
+
+
+def test_writes_spread_by_key(client, api_headers, router):
+    """Test events go to the shard of their key, with globally unique ids."""
+    ids = []
+    for i in range(30):
+        response = client.post("/v1/events", json=_event(f"st-{i}", f"EX{i % 6}", f"src-{i % 6}"), headers=api_headers)
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+
+    counts = _shard_counts(router)
+    assert sum(counts) == 30
+    assert sum(1 for c in counts if c) > 1
+    assert len(set(ids)) == 30
+    for i, event_id in enumerate(ids):
+        key = f"src-{i % 6}" if router.key == "source" else f"EX{i % 6}"
+        assert event_id % router.count == router.shard_of(key)
+
+
+def test_batch_split_across_shards(client, api_headers, router):
+    """Test a batch is split by shard and fully inserted."""
+    events = [_event(f"st-{i}", f"EX{i % 5}", f"src-{i % 5}") for i in range(40)]
+    response = client.post("/v1/events/batch", json={"events": events}, headers=api_headers)
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 40}
+    assert sum(_shard_counts(router)) == 40
+
+
+def test_list_merges_shards_newest_first(client, api_headers, router):
+    """Test the list endpoint pages through all shards without gaps or repeats."""
+    for i in range(25):
+        client.post("/v1/events", json=_event(f"st-{i}", f"EX{i % 4}", f"src-{i % 4}"), headers=api_headers)
+
+    seen = []
+    for offset in range(0, 30, 10):
+        page = client.get(f"/v1/events?limit=10&offset={offset}", headers=api_headers).json()
+        seen += [e["payload"]["stid"] for e in page]
+    assert sorted(seen) == sorted(f"st-{i}" for i in range(25))
+
+    stamps = [e["received_at"] for e in client.get("/v1/events?limit=25", headers=api_headers).json()]
+    assert stamps == sorted(stamps, reverse=True)
+    assert len(set(stamps)) == 25
+
+
+def test_lookup_finds_latest_on_any_shard(client, api_headers, router):
+    """Test the lookup returns the newest match whichever shard holds it."""
+    client.post("/v1/events", json=_event("st-1", "EX1", "a"), headers=api_headers)
+    newest = client.post("/v1/events", json=_event("st-1", "EX1", "b"), headers=api_headers).json()
+    client.post("/v1/events", json=_event("st-1", "EX2", "c"), headers=api_headers)
+
+    response = client.get("/v1/events/st-1?exnum=EX1", headers=api_headers)
+    assert response.status_code == 200
+    assert response.json()["source"] == "b"
+    assert response.json()["id"] == newest["id"]
+    assert client.get("/v1/events/st-9?exnum=EX1", headers=api_headers).status_code == 404
+
+
+def test_search_fans_out(client, api_headers, router):
+    """Test full-text search covers every shard."""
+    for i in range(6):
+        client.post("/v1/events", json=_event(f"st-{i}", f"EX{i}", f"src-{i}"), headers=api_headers)
+
+    response = client.get("/v1/events/search?q=Insert&limit=50", headers=api_headers)
+    assert response.status_code == 200
+    assert sorted(hit["payload"]["stid"] for hit in response.json()) == [f"st-{i}" for i in range(6)]
+
+
+def test_exnum_scoped_reads(client, api_headers, router, monkeypatch):
+    """Test columns and history route to the exnum's shard, or 501 when sharded by source."""
+    monkeypatch.setenv("TABLE_CELLS", "1")
+    monkeypatch.setenv("DELTA_HISTORY", "1")
+    client.post("/v1/events", json=_event("st-1", "EX1"), headers=api_headers)
+    created = client.post("/v1/events", json=_event("st-1", "EX1"), headers=api_headers).json()
+
+    columns = client.get("/v1/events/columns?exnum=EX1&column=Insert", headers=api_headers)
+    history = client.get("/v1/events/st-1/history?exnum=EX1", headers=api_headers)
+    if router.key == "source":
+        assert columns.status_code == 501
+        assert history.status_code == 501
+    else:
+        assert columns.json()[0]["id"] == created["id"]
+        assert [v["event_id"] for v in history.json()][-1] == created["id"]
+
+
+def test_backup_per_shard(client, api_headers, admin_headers, router, tmp_path):
+    """Test backups copy one shard at a time and together hold every event."""
+    for i in range(8):
+        client.post("/v1/events", json=_event(f"st-{i}", f"EX{i}", f"src-{i}"), headers=api_headers)
+
+    assert client.get("/v1/admin/backup", headers=admin_headers).status_code == 409
+    assert client.get(f"/v1/admin/backup?shard={router.count}", headers=admin_headers).status_code == 409
+
+    total = 0
+    for shard in range(router.count):
+        response = client.get(f"/v1/admin/backup?shard={shard}", headers=admin_headers)
+        assert response.status_code == 200
+        assert f".shard{shard}.db.gz" in response.headers["content-disposition"]
+        path = tmp_path / f"restored{shard}.db"
+        path.write_bytes(gzip.decompress(response.content))
+        conn = sqlite3.connect(path)
+        total += conn.execute("SELECT count(*) FROM events").fetchone()[0]
+        conn.close()
+    assert total == 8
+
+
+def test_bulk_import_and_backfill_route_to_shards(client, api_headers, tmp_path, monkeypatch):
+    """Test the bulk import and cells backfill CLIs put every event on the shard of its key."""
+    monkeypatch.setenv("SHARD_COUNT", "3")
+    monkeypatch.setenv("SHARD_KEY", "exnum")
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    path = tmp_path / "events.ndjson"
+    with open(path, "w") as f:
+        for i in range(8):
+            f.write(json.dumps({"source": "import", "payload": _event(f"s{i}", f"EX{i}")["payload"]}) + "\n")
+
+    assert bulk_import.main([str(path), "--database-url", url, "--quiet"]) == 0
+    assert columnar.main(["--database-url", url]) == 0
+
+    router = ShardRouter([make_engine(shard_url(url, i)) for i in range(3)], "exnum")
+    app.dependency_overrides[get_router] = lambda: router
+    try:
+        assert sum(_shard_counts(router)) == 8
+        for i in range(8):
+            response = client.get(f"/v1/events/s{i}?exnum=EX{i}", headers=api_headers)
+            assert response.status_code == 200
+            assert response.json()["id"] % 3 == router.shard_of(f"EX{i}")
+            columns = client.get(f"/v1/events/columns?exnum=EX{i}&column=Insert", headers=api_headers).json()
+            assert columns[0]["columns"] == {"Insert": [True]}
+    finally:
+        for engine in router.engines:
+            engine.dispose()
+
+
+def test_primary_refuses_sharding(monkeypatch):
+    """Test a replication primary does not start with sharding on."""
+    monkeypatch.setenv("REPLICATION_ROLE", "primary")
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    with pytest.raises(RuntimeError, match="SHARD_COUNT"):
+        with TestClient(app):
+            pass
+
+
+def test_replica_with_sharding_serves_no_reads(api_headers, monkeypatch):
+    """Test a replica stays unready with sharding on, so reads go to the primary."""
+    monkeypatch.setenv("REPLICATION_ROLE", "replica")
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setenv("API_KEY", api_headers["X-API-Key"])
+    with TestClient(app) as client:
+        response = client.get("/v1/events", headers=api_headers)
+    assert response.status_code == 503
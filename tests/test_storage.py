@@ -0,0 +1,131 @@
+"""Tests for the storage backend abstraction (SQLite) and the batch endpoint."""
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app.rows import EventRow, EventsResponse
+from app.schemas import EventOut
+from app.storage import PostgresEventStore, SQLiteEventStore, store_for
+
+
+def _payload(i, exnum="EX1"):
+    return {"stid": f"st-{i}", "exnum": exnum, "table": {"i": i}}
+
+
+def test_store_for_sqlite(test_db_session):
+    """Test the backend is selected from the session dialect."""
+    store = store_for(test_db_session)
+    assert isinstance(store, SQLiteEventStore)
+    assert store.sqlite_features is True
+    assert PostgresEventStore.sqlite_features is False
+
+
+def test_add_many_and_recent(test_db_session):
+    """Test batch insert and newest-first paging."""
+    store = store_for(test_db_session)
+    assert store.add_many(("batch", _payload(i)) for i in range(5)) == 5
+    test_db_session.commit()
+
+    page = store.recent(limit=2, offset=1)
+    assert [e.payload["stid"] for e in page] == ["st-3", "st-2"]
+
+
+def test_latest_matches_stid_and_exnum(test_db_session):
+    """Test the lookup returns the newest matching event only."""
+    store = store_for(test_db_session)
+    store.add("a", _payload(1))
+    newest = store.add("b", _payload(1))
+    store.add("c", _payload(1, exnum="EX2"))
+    store.add("d", {"stid": 1, "exnum": "EX1", "table": {}})  # numeric stid
+    test_db_session.commit()
+
+    assert store.latest("st-1", "EX1").id == newest.id
+    assert store.latest("st-1", "EX3") is None
+    assert store.latest("1", "EX1") is None  # same semantics as the old Python filter
+
+
+def test_latest_uses_expression_index(test_db_session, test_db_engine):
+    """Test the lookup query is answered from ix_events_stid_exnum."""
+    store = store_for(test_db_session)
+    store.add_many(("x", _payload(i)) for i in range(50))
+    test_db_session.commit()
+
+    captured = []
+
+    @event.listens_for(test_db_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "json_extract" in statement:
+            captured.append((statement, parameters))
+
+    store.latest("st-7", "EX1")
+    event.remove(test_db_engine, "before_cursor_execute", capture)
+
+    statement, parameters = captured[0]
+    with test_db_engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    assert any("ix_events_stid_exnum" in row[-1] for row in plan)
+
+
+def test_batch_endpoint(client, api_headers):
+    """Test inserting several events in one request."""
+    body = {"events": [{"source": "batch", "payload": _payload(i)} for i in range(3)]}
+
+    response = client.post("/v1/events/batch", json=body, headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 3}
+    listed = client.get("/v1/events", headers=api_headers).json()
+    assert [e["payload"]["stid"] for e in listed] == ["st-2", "st-1", "st-0"]
+
+
+def test_batch_endpoint_is_atomic(client, api_headers):
+    """Test a batch with one invalid event inserts nothing."""
+    body = {"events": [{"payload": _payload(0)}, {"payload": {"stid": "x", "exnum": "EX1"}}]}
+
+    response = client.post("/v1/events/batch", json=body, headers=api_headers)
+
+    assert response.status_code == 422
+    assert "events[1].payload" in response.json()["detail"]
+    assert client.get("/v1/events", headers=api_headers).json() == []
+
+
+def test_batch_endpoint_size_limit(client, api_headers, monkeypatch):
+    """Test MAX_BATCH_EVENTS is enforced."""
+    monkeypatch.setenv("MAX_BATCH_EVENTS", "2")
+    body = {"events": [{"payload": _payload(i)} for i in range(3)]}
+
+    response = client.post("/v1/events/batch", json=body, headers=api_headers)
+
+    assert response.status_code == 413
+
+
+def test_batch_endpoint_empty(client, api_headers):
+    """Test an empty batch is a validation error."""
+    response = client.post("/v1/events/batch", json={"events": []}, headers=api_headers)
+    assert response.status_code == 422
+
+
+def test_batch_endpoint_runs_hooks(client, api_headers, monkeypatch):
+    """Test the per-event path is used when columnar storage is enabled."""
+    monkeypatch.setenv("TABLE_CELLS", "1")
+    body = {"events": [{"payload": _payload(i)} for i in range(2)]}
+    client.post("/v1/events/batch", json=body, headers=api_headers)
+
+    response = client.get("/v1/events/columns?exnum=EX1&column=i", headers=api_headers)
+    assert [r["columns"] for r in response.json()] == [{"i": [1]}, {"i": [0]}]
+
+
+def test_recent_returns_slim_rows(test_db_session):
+    """Test reads return slotted rows that serialize like EventOut."""
+    store = store_for(test_db_session)
+    e = store.add("src", {"stid": "st-1", "exnum": "EX1", "table": {"a": [1, None, "é"]}})
+    test_db_session.commit()
+
+    [row] = store.recent(limit=10, offset=0)
+    assert isinstance(row, EventRow)
+    assert not hasattr(row, "__dict__")
+
+    expected = EventOut(id=e.id, received_at=e.received_at.isoformat(), source="src", payload=e.payload)
+    assert json.loads(row.to_json()) == expected.model_dump()
+    assert json.loads(EventsResponse([row]).body) == [expected.model_dump()]